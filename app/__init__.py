@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import os
@@ -39,42 +39,127 @@ def create_app(config_class=None):
     app.register_blueprint(camera_bp, url_prefix='/camera')
     app.register_blueprint(reports_bp, url_prefix='/reports')
 
+    from app.cli import register_commands
+    register_commands(app)
+
+    # Keeps attendance_bitmaps in step with attendance writes
+    from app import bitmaps  # noqa: F401
+
     with app.app_context():
-        db.create_all()
-        _run_migrations(db)
+        from app.profiling import init_profiling
+        init_profiling(app, db.engine)
+        _init_schema(db)
+
+        # Students already marked today, shared by every write path in this process
+        from app.marking import MarkedToday
+        app.extensions['marked_today'] = MarkedToday(recheck=app.config.get('MARKED_CACHE_RECHECK', 60))
+        app.extensions['marked_today'].warm()
 
     return app
 
 
-def _run_migrations(db):
-    """Apply any pending schema migrations safely."""
+# Bump when models change or a step is added to _run_migrations
+SCHEMA_VERSION = 9
+
+
+def _init_schema(db):
+    """
+    Create tables and apply migrations only when the stored schema
+    version is behind, so a normal boot costs a single query.
+    """
     import sqlalchemy as sa
     try:
         with db.engine.connect() as conn:
-            inspector = sa.inspect(db.engine)
-
-            # Ensure departments table exists
-            existing_tables = inspector.get_table_names()
-            if 'departments' not in existing_tables:
-                conn.execute(sa.text(
-                    'CREATE TABLE IF NOT EXISTS departments '
-                    '(id INTEGER PRIMARY KEY AUTOINCREMENT, '
-                    'code VARCHAR(20) UNIQUE NOT NULL, '
-                    'name VARCHAR(100) NOT NULL, '
-                    'block VARCHAR(100), '
-                    'warden VARCHAR(100), '
-                    'created_at DATETIME DEFAULT CURRENT_TIMESTAMP)'
-                ))
-                conn.commit()
-                print('[Migration] departments table created.')
-
-            # Ensure department_id column exists in attendance
-            cols = [c['name'] for c in inspector.get_columns('attendance')]
-            if 'department_id' not in cols:
-                conn.execute(sa.text(
-                    'ALTER TABLE attendance ADD COLUMN department_id INTEGER REFERENCES departments(id)'
-                ))
-                conn.commit()
-                print('[Migration] department_id column added to attendance.')
-    except Exception as e:
-        print(f'[Migration] Warning: {e}')
+            current = conn.execute(sa.text('SELECT version FROM schema_version')).scalar() or 0
+    except Exception:
+        current = 0
+    if current >= SCHEMA_VERSION:
+        return
+
+    db.create_all()
+    try:
+        _run_migrations(db)
+    except Exception:
+        # Leave the version unstamped so the next boot retries the failed step
+        current_app.logger.exception('[Migration] failed; schema left at version %s', current)
+        raise
+    with db.engine.begin() as conn:
+        conn.execute(sa.text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+        conn.execute(sa.text('DELETE FROM schema_version'))
+        conn.execute(sa.text('INSERT INTO schema_version (version) VALUES (:v)'), {'v': SCHEMA_VERSION})
+    print(f'[Migration] schema at version {SCHEMA_VERSION}.')
+
+
+def _run_migrations(db):
+    """Apply any pending schema migrations. Every step is idempotent; errors propagate."""
+    import sqlalchemy as sa
+    with db.engine.connect() as conn:
+        inspector = sa.inspect(db.engine)
+
+        # Ensure departments table exists
+        existing_tables = inspector.get_table_names()
+        if 'departments' not in existing_tables:
+            conn.execute(sa.text(
+                'CREATE TABLE IF NOT EXISTS departments '
+                '(id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'code VARCHAR(20) UNIQUE NOT NULL, '
+                'name VARCHAR(100) NOT NULL, '
+                'block VARCHAR(100), '
+                'warden VARCHAR(100), '
+                'created_at DATETIME DEFAULT CURRENT_TIMESTAMP)'
+            ))
+            conn.commit()
+            print('[Migration] departments table created.')
+
+        # Ensure department_id column exists in attendance
+        cols = [c['name'] for c in inspector.get_columns('attendance')]
+        if 'department_id' not in cols:
+            conn.execute(sa.text(
+                'ALTER TABLE attendance ADD COLUMN department_id INTEGER REFERENCES departments(id)'
+            ))
+            conn.commit()
+            print('[Migration] department_id column added to attendance.')
+
+        # Idempotency keys for batch marks replayed by kiosks
+        if 'idempotency_key' not in cols:
+            conn.execute(sa.text('ALTER TABLE attendance ADD COLUMN idempotency_key VARCHAR(64)'))
+            conn.execute(sa.text(
+                'CREATE UNIQUE INDEX IF NOT EXISTS ix_attendance_idempotency_key ON attendance (idempotency_key)'
+            ))
+            conn.commit()
+            print('[Migration] idempotency_key column added to attendance.')
+
+        # Archived rows keep their keys so a replay after archiving is still a duplicate
+        archive_cols = [c['name'] for c in inspector.get_columns('attendance_archive')]
+        if 'idempotency_key' not in archive_cols:
+            conn.execute(sa.text('ALTER TABLE attendance_archive ADD COLUMN idempotency_key VARCHAR(64)'))
+            conn.execute(sa.text(
+                'CREATE UNIQUE INDEX IF NOT EXISTS ix_attendance_archive_idempotency_key '
+                'ON attendance_archive (idempotency_key)'
+            ))
+            conn.commit()
+            print('[Migration] idempotency_key column added to attendance_archive.')
+
+        # Indexes for the paginated student directory (prefix search + filters)
+        for stmt in (
+            'CREATE INDEX IF NOT EXISTS ix_students_name_nocase ON students (name COLLATE NOCASE)',
+            'CREATE INDEX IF NOT EXISTS ix_students_student_id_nocase ON students (student_id COLLATE NOCASE)',
+            'CREATE INDEX IF NOT EXISTS ix_students_department_year ON students (department, year)',
+            'CREATE INDEX IF NOT EXISTS ix_students_created_at ON students (created_at)',  # sort=recent
+            'CREATE INDEX IF NOT EXISTS ix_attendance_date_department ON attendance (date, department_id)',
+        ):
+            conn.execute(sa.text(stmt))
+        conn.commit()
+
+        # Bitmaps are keyed by block since version 8; the old ones are rebuilt below
+        from app.models import Attendance, AttendanceBitmap
+        if 'department_id' not in [c['name'] for c in inspector.get_columns('attendance_bitmaps')]:
+            conn.execute(sa.text('DROP TABLE attendance_bitmaps'))
+            AttendanceBitmap.__table__.create(conn)
+            conn.commit()
+            print('[Migration] attendance_bitmaps recreated with a department_id key.')
+
+    # Build attendance bitmaps for data recorded before they existed
+    if Attendance.query.first() and not AttendanceBitmap.query.first():
+        from app.bitmaps import rebuild_bitmaps
+        print(f'[Migration] built {rebuild_bitmaps()} attendance bitmaps.')
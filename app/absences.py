@@ -0,0 +1,199 @@
+"""
+Set-based absence computation.
+
+A student is absent on a working day when they were on the active roster
+(enrolled on or before that day) and no attendance row exists for them.
+Counts come from GROUP BY queries over (student, day), so a day with
+rows in two blocks counts once. The absent (student, day) pairs listed
+by the CSV export come from the attendance bitmaps instead, as a roster x
+calendar bit matrix with the marked days cleared. The bitmaps follow ORM
+writes only: after inserting or deleting attendance rows with raw SQL,
+run `flask rebuild-bitmaps`, or the export and student_summary() will
+disagree about who was absent.
+"""
+from datetime import date, timedelta
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from app.models import Student, Department
+from app.archive import attendance_models
+
+STATUSES = ('present', 'absent', 'late')
+
+
+def working_days(start_date, end_date):
+    """Days in [start_date, end_date] (capped at today) that count towards attendance."""
+    weekdays = set(current_app.config.get('WORKING_WEEKDAYS', range(7)))
+    holidays = {date.fromisoformat(d) if isinstance(d, str) else d
+                for d in current_app.config.get('ATTENDANCE_HOLIDAYS', [])}
+    end_date = min(end_date, date.today())
+    days = []
+    day = start_date
+    while day <= end_date:
+        if day.weekday() in weekdays and day not in holidays:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def active_roster(department_id=None):
+    """Active students (of the department, when given) as a DataFrame."""
+    import pandas as pd
+    query = db.session.query(
+        Student.id, Student.student_id, Student.name, Student.department, Student.created_at
+    ).filter(Student.is_active.is_(True))
+    if department_id:
+        department = db.session.get(Department, department_id)
+        if department is None:
+            query = query.filter(False)
+        else:
+            query = query.filter(Student.department == department.name)
+
+    roster = pd.DataFrame(query.all(), columns=['id', 'student_id', 'name', 'department', 'created_at'])
+    roster['enrolled'] = pd.to_datetime(roster['created_at']).dt.normalize()
+    return roster.drop(columns='created_at')
+
+
+def _non_working(start_date, end_date, days):
+    """Calendar days in the range that are not working days, for NOT IN filters."""
+    working = set(days)
+    total = (end_date - start_date).days + 1
+    return [start_date + timedelta(days=i) for i in range(total)
+            if start_date + timedelta(days=i) not in working]
+
+
+def _status_rank(model):
+    """SQL rank of a row's status for picking one status per day: lower wins."""
+    from sqlalchemy import case
+    return case(
+        *[(model.status == status, rank) for rank, status in enumerate(STATUSES) if status != 'present'],
+        (model.status.is_(None), 0), (model.status == 'present', 0),
+        else_=len(STATUSES),
+    )
+
+
+def _status_counts(start_date, end_date, department_id=None):
+    """
+    Days per (student, status) as a DataFrame indexed by student db id.
+    A student with several rows on one day (e.g. in two blocks) counts
+    that day once, under the best status in STATUSES order; statuses
+    outside STATUSES count as 'other'.
+    """
+    import pandas as pd
+    names = dict(enumerate(STATUSES))
+    frames = []
+    for model in attendance_models(start_date):
+        query = db.session.query(
+            model.student_id.label('id'), model.date, func.min(_status_rank(model)).label('best')
+        ).filter(model.date >= start_date, model.date <= end_date)
+        if department_id:
+            query = query.filter(model.department_id == department_id)
+        days = query.group_by(model.student_id, model.date).subquery()
+        frames.append(pd.DataFrame(
+            db.session.query(days.c.id, days.c.best, func.count()).group_by(days.c.id, days.c.best).all(),
+            columns=['id', 'rank', 'count']
+        ))
+
+    counts = pd.concat(frames)
+    counts['status'] = counts['rank'].map(names).fillna('other')
+    counts = counts.pivot_table(index='id', columns='status', values='count', aggfunc='sum', fill_value=0)
+    return counts.reindex(columns=sorted(set(counts.columns) | set(STATUSES)), fill_value=0)
+
+
+def _marked_days(start_date, days):
+    """Working days on or after enrollment with any attendance row, per student (any department)."""
+    import pandas as pd
+    if not days:
+        return pd.Series(dtype='int64')
+    non_working = _non_working(start_date, days[-1], days)
+    frames = []
+    for model in attendance_models(start_date):
+        query = db.session.query(model.student_id, func.count(func.distinct(model.date))) \
+            .join(Student, Student.id == model.student_id) \
+            .filter(model.date >= start_date, model.date <= days[-1],
+                    db.or_(Student.created_at.is_(None), model.date >= func.date(Student.created_at)))
+        if non_working:
+            query = query.filter(model.date.notin_(non_working))
+        frames.append(pd.DataFrame(query.group_by(model.student_id).all(), columns=['id', 'days']))
+    return pd.concat(frames).groupby('id')['days'].sum()
+
+
+def _eligible_days(roster, days):
+    """Working days on or after each student's enrollment date."""
+    import numpy as np
+    import pandas as pd
+    calendar = np.array(days, dtype='datetime64[D]')
+    # Unknown enrollment date: eligible for the whole range
+    enrolled = roster['enrolled'].fillna(pd.Timestamp('1970-01-01')).values.astype('datetime64[D]')
+    return len(calendar) - np.searchsorted(calendar, enrolled, side='left')
+
+
+def student_summary(start_date, end_date, department_id=None):
+    """
+    Per-student counts for a range with implicit absences filled in, so
+    students who were never seen show up at 0%. Returns rows sorted by name.
+    """
+    import pandas as pd
+    days = working_days(start_date, end_date)
+    roster = active_roster(department_id).set_index('id')
+    counts = _status_counts(start_date, end_date, department_id)
+
+    # Implicit absences: eligible working days with no attendance row in any block
+    marked = _marked_days(start_date, days).reindex(roster.index, fill_value=0)
+    implicit = pd.Series(_eligible_days(roster, days), index=roster.index) - marked
+
+    summary = counts.reindex(counts.index.union(roster.index), fill_value=0)
+    summary['absent'] = summary['absent'].add(implicit, fill_value=0).astype(int)
+    summary['total'] = summary[list(counts.columns)].sum(axis=1)
+
+    # Students outside the roster (inactive, other departments) that have rows
+    info = roster[['student_id', 'name', 'department']]
+    missing = summary.index.difference(info.index)
+    if len(missing):
+        extra = db.session.query(Student.id, Student.student_id, Student.name, Student.department) \
+            .filter(Student.id.in_(missing.tolist())).all()
+        info = pd.concat([info, pd.DataFrame(extra, columns=['id', 'student_id', 'name', 'department'])
+                          .set_index('id')])
+    summary = summary.join(info, how='left')
+    summary['student_id'] = summary['student_id'].fillna('')
+    summary['name'] = summary['name'].fillna('Unknown')
+    summary['department'] = summary['department'].fillna('')
+
+    summary = summary[summary['total'] > 0].sort_values('name')
+    summary['attendance_pct'] = (summary['present'] / summary['total'] * 100).round(1)
+    columns = ['student_id', 'name', 'department', *counts.columns, 'total', 'attendance_pct']
+    return [
+        {k: (int(v) if k in counts.columns or k == 'total' else v) for k, v in row.items()}
+        for row in summary[columns].to_dict('records')
+    ]
+
+
+def absent_days(start_date, end_date, department_id=None):
+    """
+    (student, day) pairs with no attendance row, as a DataFrame with
+    columns id, student_id, name, department, date. Read from the
+    attendance bitmaps: roster x working days, minus days marked in any
+    block, as one boolean matrix.
+    """
+    import numpy as np
+    import pandas as pd
+    from app.bitmaps import marked_bits, bit_matrix
+    days = working_days(start_date, end_date)
+    roster = active_roster(department_id)
+    columns = ['id', 'student_id', 'name', 'department', 'date']
+    if not days or roster.empty:
+        return pd.DataFrame(columns=columns)
+
+    offsets = [(d - start_date).days for d in days]
+    marked = marked_bits(start_date, days[-1], roster['id'].tolist() if department_id else None)
+    missing = ~bit_matrix([marked.get(i, 0) for i in roster['id']], offsets)
+
+    # Eligible from the enrollment day on (unknown enrollment: the whole range)
+    enrolled = roster['enrolled'].fillna(pd.Timestamp(start_date)).values.astype('datetime64[D]')
+    skip = (enrolled - np.datetime64(start_date, 'D')).astype(int)
+    missing &= np.array(offsets)[None, :] >= skip[:, None]
+
+    rows, cols = np.nonzero(missing)
+    absent = roster.iloc[rows][columns[:-1]].reset_index(drop=True)
+    absent['date'] = np.array(days, dtype=object)[cols]
+    return absent
@@ -0,0 +1,132 @@
+"""
+Month-partitioned archival of attendance history.
+
+Closed months are moved from `attendance` into `attendance_archive` in one
+set-based INSERT ... SELECT / DELETE, and recorded in `archived_periods`.
+Readers use attendance_records(), which only touches the archive when the
+requested range reaches back before the newest archived month.
+"""
+import calendar
+from datetime import date, timedelta
+import sqlalchemy as sa
+from app import db
+from app.models import Attendance, AttendanceArchive, ArchivedPeriod
+
+# Columns copied between the hot and archive tables (ids are not preserved)
+_COLUMNS = ['student_id', 'department_id', 'date', 'time_in', 'status',
+            'confidence', 'marked_by', 'created_at', 'idempotency_key']
+
+
+def period_bounds(period):
+    """First and last date of a 'YYYY-MM' period."""
+    try:
+        year, month = (int(p) for p in period.split('-'))
+        last_day = calendar.monthrange(year, month)[1]
+    except (ValueError, calendar.IllegalMonthError):
+        raise ValueError(f"Invalid period '{period}', expected YYYY-MM")
+    return date(year, month, 1), date(year, month, last_day)
+
+
+def archivable_periods(hot_days, today=None):
+    """Closed months that ended more than `hot_days` ago and still have rows in the hot table."""
+    cutoff = (today or date.today()) - timedelta(days=hot_days)
+    oldest = db.session.query(sa.func.min(Attendance.date)).scalar()
+    if oldest is None:
+        return []
+
+    periods = []
+    year, month = oldest.year, oldest.month
+    while True:
+        period = f'{year:04d}-{month:02d}'
+        start, end = period_bounds(period)
+        if end >= cutoff:
+            break
+        if Attendance.query.filter(Attendance.date >= start, Attendance.date <= end).first():
+            periods.append(period)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return periods
+
+
+def archive_period(period):
+    """Move one month of attendance into the archive. Returns rows moved."""
+    start, end = period_bounds(period)
+    if end >= date.today():
+        raise ValueError(f'{period} is not closed yet')
+
+    cols = ', '.join(_COLUMNS)
+    params = {'start': start.isoformat(), 'end': end.isoformat(), 'period': period}
+    try:
+        moved = db.session.execute(sa.text(
+            f'INSERT INTO attendance_archive (period, {cols}) '
+            f'SELECT :period, {cols} FROM attendance WHERE date BETWEEN :start AND :end'
+        ), params).rowcount
+        db.session.execute(sa.text(
+            'DELETE FROM attendance WHERE date BETWEEN :start AND :end'
+        ), params)
+
+        record = db.session.get(ArchivedPeriod, period)
+        if record is None:
+            record = ArchivedPeriod(period=period, start_date=start, end_date=end, row_count=0)
+            db.session.add(record)
+        record.row_count = (record.row_count or 0) + moved
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return moved
+
+
+def restore_period(period):
+    """Move an archived month back into the hot table. Returns rows restored."""
+    period_bounds(period)  # validate
+    record = db.session.get(ArchivedPeriod, period)
+    if record is None:
+        raise ValueError(f'{period} is not archived')
+
+    cols = ', '.join(_COLUMNS)
+    try:
+        restored = db.session.execute(sa.text(
+            f'INSERT INTO attendance ({cols}) '
+            f'SELECT {cols} FROM attendance_archive WHERE period = :period'
+        ), {'period': period}).rowcount
+        db.session.execute(sa.text(
+            'DELETE FROM attendance_archive WHERE period = :period'
+        ), {'period': period})
+        db.session.delete(record)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return restored
+
+
+def archive_boundary():
+    """Last date covered by the archive, or None if nothing is archived."""
+    return db.session.query(sa.func.max(ArchivedPeriod.end_date)).scalar()
+
+
+def attendance_models(start_date):
+    """Tables holding attendance from start_date on: the archive only if the range reaches it."""
+    models = [Attendance]
+    boundary = archive_boundary()
+    if boundary is not None and start_date <= boundary:
+        models.insert(0, AttendanceArchive)
+    return models
+
+
+def attendance_records(start_date, end_date, department_id=None, order_by_date=False):
+    """
+    Attendance rows in [start_date, end_date] from the hot table and,
+    when the range crosses the boundary, the archive. Archived rows have
+    the same attributes and relationships as Attendance.
+    """
+    records = []
+    for model in attendance_models(start_date):
+        query = model.query.filter(model.date >= start_date, model.date <= end_date)
+        if department_id:
+            query = query.filter(model.department_id == department_id)
+        records.extend(query.all())
+
+    if order_by_date:
+        records.sort(key=lambda r: (r.date, r.student_id))
+    return records
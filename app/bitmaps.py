@@ -0,0 +1,301 @@
+"""
+Per-student attendance bitmaps.
+
+For every (student, block, status, year) there is one row in
+`attendance_bitmaps` whose bit n is set when the student has an
+attendance row in that block with that status on day n of the year
+(block 0 for rows without a department). The bits are kept in step with the
+`attendance` and `attendance_archive` tables by ORM flush events, so range
+percentages, streaks and "below X%" lists are answered with masks and
+popcounts instead of scanning attendance rows. `flask rebuild-bitmaps`
+regenerates them from scratch.
+"""
+from datetime import date
+import sqlalchemy as sa
+from app import db
+from app.models import Attendance, AttendanceArchive, AttendanceBitmap
+
+BITMAP_BYTES = 46  # 366 bits
+
+
+def _day_index(day):
+    return (day - date(day.year, 1, 1)).days
+
+
+def _to_int(bits):
+    return int.from_bytes(bits or b'', 'little')
+
+
+def _to_bytes(value):
+    return value.to_bytes(BITMAP_BYTES, 'little')
+
+
+def _refresh_days(connection, pairs):
+    """
+    Recompute the bits of the given (student_id, day) pairs from the
+    attendance tables, with one read per table and batched writes.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+    student_ids = {s for s, _ in pairs}
+    bitmaps = AttendanceBitmap.__table__
+
+    # (block, status) keys marked per (student, day)
+    marks = {}
+    for model in (Attendance, AttendanceArchive):
+        table = model.__table__
+        rows = connection.execute(sa.select(
+            table.c.student_id, table.c.date, table.c.department_id, table.c.status
+        ).where(table.c.student_id.in_(student_ids), table.c.date.in_({d for _, d in pairs})))
+        for student_id, day, department_id, status in rows:
+            if (student_id, day) in pairs:
+                marks.setdefault((student_id, day), set()).add((department_id or 0, status or 'present'))
+
+    stored = {}
+    for student_id, department_id, status, year, bits in connection.execute(sa.select(
+        bitmaps.c.student_id, bitmaps.c.department_id, bitmaps.c.status, bitmaps.c.year, bitmaps.c.bits
+    ).where(bitmaps.c.student_id.in_(student_ids), bitmaps.c.year.in_({d.year for _, d in pairs}))):
+        stored.setdefault((student_id, year), {})[(department_id, status)] = _to_int(bits)
+
+    updated = {key: dict(values) for key, values in stored.items()}
+    for student_id, day in pairs:
+        current = updated.setdefault((student_id, day.year), {})
+        marked = marks.get((student_id, day), set())
+        bit = 1 << _day_index(day)
+        for key in set(current) | marked:
+            value = current.get(key, 0)
+            current[key] = value | bit if key in marked else value & ~bit
+
+    inserts, updates, deletes = [], [], []
+    for (student_id, year), values in updated.items():
+        before = stored.get((student_id, year), {})
+        for (department_id, status), value in values.items():
+            row = {'b_student': student_id, 'b_department': department_id, 'b_status': status, 'b_year': year}
+            if (department_id, status) not in before:
+                if value:
+                    inserts.append({'student_id': student_id, 'department_id': department_id, 'status': status,
+                                    'year': year, 'bits': _to_bytes(value)})
+            elif not value:
+                deletes.append(row)
+            elif value != before[(department_id, status)]:
+                updates.append({**row, 'b_bits': _to_bytes(value)})
+
+    match = (bitmaps.c.student_id == sa.bindparam('b_student'),
+             bitmaps.c.department_id == sa.bindparam('b_department'),
+             bitmaps.c.status == sa.bindparam('b_status'), bitmaps.c.year == sa.bindparam('b_year'))
+    if inserts:
+        connection.execute(bitmaps.insert(), inserts)
+    if updates:
+        connection.execute(bitmaps.update().where(*match).values(bits=sa.bindparam('b_bits')), updates)
+    if deletes:
+        connection.execute(bitmaps.delete().where(*match), deletes)
+
+
+def _touched_days(target):
+    """(student_id, day) pairs affected by a write, including the old date of a moved row."""
+    pairs = [(target.student_id, target.date)]
+    for old_date in sa.inspect(target).attrs.date.history.deleted or ():
+        if old_date is not None:
+            pairs.append((target.student_id, old_date))
+    return [(s, d) for s, d in pairs if s is not None and d is not None]
+
+
+def _on_write(mapper, connection, target):
+    # Collected per flush and applied together in _after_flush
+    session = sa.orm.object_session(target)
+    session.info.setdefault('bitmap_days', set()).update(_touched_days(target))
+
+
+def _after_flush(session, flush_context):
+    pairs = session.info.pop('bitmap_days', None)
+    if pairs:
+        _refresh_days(session.connection(), pairs)
+
+
+def _keep_old_date(target, value, oldvalue, initiator):
+    return value
+
+
+for _model in (Attendance, AttendanceArchive):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        sa.event.listen(_model, _event, _on_write)
+    # Load the previous date on assignment so a moved row clears its old bit
+    sa.event.listen(_model.date, 'set', _keep_old_date, active_history=True)
+sa.event.listen(sa.orm.Session, 'after_flush', _after_flush)
+
+
+def rebuild_bitmaps():
+    """Regenerate every bitmap from the attendance tables. Returns the number of bitmaps."""
+    values = {}
+    for model in (Attendance, AttendanceArchive):
+        rows = db.session.query(model.student_id, model.department_id, model.status, model.date).distinct()
+        for student_id, department_id, status, day in rows:
+            key = (student_id, department_id or 0, status or 'present', day.year)
+            values[key] = values.get(key, 0) | (1 << _day_index(day))
+
+    try:
+        db.session.query(AttendanceBitmap).delete()
+        if values:
+            db.session.execute(sa.insert(AttendanceBitmap), [
+                {'student_id': s, 'department_id': d, 'status': status, 'year': year, 'bits': _to_bytes(v)}
+                for (s, d, status, year), v in values.items()
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(values)
+
+
+def range_bits(start_date, end_date, student_ids=None, department_id=None):
+    """
+    Bitmaps re-based onto [start_date, end_date] (bit 0 = start_date), as
+    {student_id: {status: int}}: rows in `department_id` only when given,
+    otherwise in any block.
+    """
+    length = (end_date - start_date).days + 1
+    mask = (1 << length) - 1
+    query = db.session.query(AttendanceBitmap).filter(
+        AttendanceBitmap.year >= start_date.year, AttendanceBitmap.year <= end_date.year
+    )
+    if student_ids is not None:
+        query = query.filter(AttendanceBitmap.student_id.in_(student_ids))
+    if department_id:
+        query = query.filter(AttendanceBitmap.department_id == department_id)
+
+    result = {}
+    for bitmap in query:
+        offset = (date(bitmap.year, 1, 1) - start_date).days
+        value = _to_int(bitmap.bits)
+        value = value << offset if offset >= 0 else value >> -offset
+        statuses = result.setdefault(bitmap.student_id, {})
+        statuses[bitmap.status] = statuses.get(bitmap.status, 0) | (value & mask)
+    return result
+
+
+def _union(statuses):
+    """Union of a {status: int} mapping: the days with a row of any status."""
+    value = 0
+    for bits in statuses.values():
+        value |= bits
+    return value
+
+
+def marked_bits(start_date, end_date, student_ids=None):
+    """Days with any attendance row (any status, any block) re-based onto the range, as {student_id: int}."""
+    return {student_id: _union(statuses)
+            for student_id, statuses in range_bits(start_date, end_date, student_ids).items()}
+
+
+def bit_matrix(values, columns):
+    """Boolean matrix with one row per range int in `values`, keeping only the bit positions in `columns`."""
+    import numpy as np
+    if not values or not columns:
+        return np.zeros((len(values), len(columns)), dtype=bool)
+    width = (max(columns) + 8) // 8
+    mask = (1 << (width * 8)) - 1
+    packed = np.frombuffer(b''.join((v & mask).to_bytes(width, 'little') for v in values), dtype=np.uint8)
+    bits = np.unpackbits(packed.reshape(len(values), width), axis=1, bitorder='little')
+    return bits[:, columns].astype(bool)
+
+
+def _streaks(attended, columns, open_ended):
+    """
+    Longest and current run of attended working days per student.
+    `attended` is a list of range ints, `columns` the working-day bit
+    positions. When the range ends today, an unmarked today does not
+    break the current streak.
+    """
+    import numpy as np
+    if not attended or not columns:
+        return [0] * len(attended), [0] * len(attended)
+    bits = bit_matrix(attended, columns).astype(np.int64)
+
+    # Run length ending at each column: cumulative count minus the count at the last miss
+    count = np.cumsum(bits, axis=1)
+    runs = count - np.maximum.accumulate(np.where(bits == 0, count, 0), axis=1)
+    current = runs[:, -1]
+    if open_ended and len(columns) > 1:
+        current = np.where(bits[:, -1] == 1, runs[:, -1], runs[:, -2])
+    return runs.max(axis=1).tolist(), current.tolist()
+
+
+def range_stats(start_date, end_date, department_id=None, below=None):
+    """
+    Per-student day counts, attendance percentage and streaks for a range,
+    from the bitmaps, matching student_summary(): with `department_id`
+    only rows in that block count, a day marked in several blocks counts
+    once under its best status, and working days since enrollment with
+    no row in any block count as absent. With `below`, only students
+    under that percentage are returned, lowest first; otherwise sorted
+    by name.
+    """
+    import pandas as pd
+    from app.absences import working_days, active_roster
+    from app.models import Student
+    end_date = min(end_date, date.today())
+    if end_date < start_date:
+        return []
+    roster = active_roster(department_id)
+    bits = range_bits(start_date, end_date, department_id=department_id)
+    if department_id:
+        marked_any = marked_bits(start_date, end_date, roster['id'].tolist())
+    else:
+        marked_any = {student_id: _union(statuses) for student_id, statuses in bits.items()}
+
+    columns = [(d - start_date).days for d in working_days(start_date, end_date)]
+    working = sum(1 << c for c in columns)
+
+    # Students off the roster (inactive, other departments) that have rows
+    students = [(s.id, s.student_id, s.name, s.department, s.enrolled) for s in roster.itertuples(index=False)]
+    missing = set(bits) - set(roster['id'])
+    if missing:
+        students += [(*s, pd.NaT) for s in db.session.query(
+            Student.id, Student.student_id, Student.name, Student.department
+        ).filter(Student.id.in_(missing))]
+
+    rows, attended = [], []
+    for student_id, roll, name, department, enrolled in students:
+        statuses = bits.get(student_id, {})
+        eligible = 0
+        if student_id not in missing:
+            eligible = working
+            if pd.notna(enrolled):
+                skip = (enrolled.date() - start_date).days
+                if skip > 0:
+                    eligible &= ~((1 << skip) - 1)
+        implicit = eligible & ~marked_any.get(student_id, 0)
+
+        # One status per day, in STATUSES order: present, then absent, then late
+        present = statuses.get('present', 0)
+        absent = statuses.get('absent', 0) & ~present
+        late = statuses.get('late', 0) & ~present & ~absent
+        total = (_union(statuses) | implicit).bit_count()
+        if not total:
+            continue
+        pct = round(present.bit_count() / total * 100, 1)
+        if below is not None and pct >= below:
+            continue
+        rows.append({
+            'student_id': roll,
+            'name': name,
+            'department': department or '',
+            'present': present.bit_count(),
+            'late': late.bit_count(),
+            'absent': (absent | implicit).bit_count(),
+            'total': total,
+            'attendance_pct': pct,
+        })
+        attended.append(present | late)
+
+    longest, current = _streaks(attended, columns, end_date == date.today())
+    for row, best, now in zip(rows, longest, current):
+        row['longest_streak'] = int(best)
+        row['current_streak'] = int(now)
+
+    if below is not None:
+        rows.sort(key=lambda r: (r['attendance_pct'], r['name']))
+    else:
+        rows.sort(key=lambda r: r['name'])
+    return rows
@@ -0,0 +1,243 @@
+import os
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app import db
+
+
+def register_commands(app):
+    """Attach maintenance commands to `flask --app run <command>`."""
+    app.cli.add_command(reencode_gallery)
+    app.cli.add_command(audit_duplicates)
+    app.cli.add_command(backfill_thumbnails)
+    app.cli.add_command(archive_attendance)
+    app.cli.add_command(restore_attendance)
+    app.cli.add_command(rebuild_bitmaps)
+    app.cli.add_command(camera_worker)
+
+
+@click.command('reencode-gallery')
+@with_appcontext
+def reencode_gallery():
+    """Re-encode every student photo, reusing cached encodings for unchanged photos."""
+    from app.models import Student
+    from app.face_utils import encode_face_from_image, save_encoding, encoding_cache
+
+    cache = encoding_cache(current_app.config)
+    encoded = reused = failed = missing = 0
+
+    students = Student.query.filter(Student.photo_path.isnot(None)).all()
+    for student in students:
+        path = os.path.join(current_app.static_folder, student.photo_path)
+        if not os.path.exists(path):
+            missing += 1
+            continue
+
+        key = cache.key_for(path)  # hashed once, reused for the lookup below
+        cached = key in cache
+        encoding, err = encode_face_from_image(path, cache, key=key)
+        if err:
+            failed += 1
+            click.echo(f'  {student.student_id}: {err}')
+            continue
+
+        enc_path, enc_err = save_encoding(encoding, student.student_id, current_app.config['ENCODINGS_FOLDER'])
+        if enc_err:
+            failed += 1
+            click.echo(f'  {student.student_id}: {enc_err}')
+            continue
+        student.encoding_path = enc_path
+        if cached:
+            reused += 1
+        else:
+            encoded += 1
+
+    db.session.commit()
+    click.echo(f'Encoded {encoded}, reused {reused} cached, '
+               f'{failed} failed, {missing} photos missing.')
+
+
+@click.command('audit-duplicates')
+@with_appcontext
+@click.option('--tolerance', type=float, default=None, help='Report pairs at or below this distance.')
+@click.option('--block-size', type=int, default=1024, help='Rows per distance block.')
+def audit_duplicates(tolerance, block_size):
+    """Report pairs of enrolled students whose faces are suspiciously close."""
+    import time
+    from app.models import Student
+    from app.face_utils import load_gallery, find_close_pairs
+
+    if tolerance is None:
+        tolerance = current_app.config.get('DUPLICATE_FACE_TOLERANCE', 0.5)
+    keys, matrix = load_gallery(current_app.config['ENCODINGS_FOLDER'])
+    start = time.perf_counter()
+    pairs = find_close_pairs(matrix, tolerance, block_size)
+    elapsed = time.perf_counter() - start
+
+    names = {s.student_id: s.name for s in Student.query.all()}
+    for i, j, distance in pairs:
+        a, b = keys[i], keys[j]
+        click.echo(f'{distance:.3f}  {a} ({names.get(a, "?")})  <->  {b} ({names.get(b, "?")})')
+    click.echo(f'{len(pairs)} pairs within {tolerance} among {len(keys)} students ({elapsed:.2f}s).')
+
+
+@click.command('backfill-thumbnails')
+@click.option('--force', is_flag=True, help='Regenerate thumbnails that already exist.')
+@with_appcontext
+def backfill_thumbnails(force):
+    """Generate listing thumbnails for photos already in the upload folder."""
+    from app.face_utils import allowed_file
+    from app.thumbnails import make_thumbnails, thumbnail_name, thumbnail_path
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    thumbs_folder = current_app.config['THUMBNAIL_FOLDER']
+    created = skipped = failed = 0
+    before = after = 0
+
+    for filename in sorted(os.listdir(upload_folder)):
+        source = os.path.join(upload_folder, filename)
+        if not os.path.isfile(source) or not allowed_file(filename):
+            continue
+        name = thumbnail_name(filename)
+        thumb = thumbnail_path(name, thumbs_folder, 'webp')
+        if os.path.exists(thumb) and not force:
+            skipped += 1
+            continue
+
+        _, err = make_thumbnails(
+            source, thumbs_folder,
+            size=current_app.config.get('THUMBNAIL_SIZE', 320),
+            quality=current_app.config.get('THUMBNAIL_QUALITY', 80),
+        )
+        if err:
+            failed += 1
+            click.echo(f'  {filename}: {err}')
+            continue
+        created += 1
+        before += os.path.getsize(source)
+        after += os.path.getsize(thumb)
+
+    click.echo(f'Created {created}, skipped {skipped} existing, {failed} failed.')
+    if created:
+        click.echo(f'Photos {before / 1024:.0f} KB -> WebP thumbnails {after / 1024:.0f} KB.')
+
+
+@click.command('archive-attendance')
+@click.option('--period', help='Month to archive (YYYY-MM). Defaults to every closed month past ATTENDANCE_HOT_DAYS.')
+@with_appcontext
+def archive_attendance(period):
+    """Move closed months of attendance into the archive table."""
+    from app.archive import archive_period, archivable_periods
+    from app.models import ArchivedPeriod
+
+    periods = [period] if period else archivable_periods(current_app.config.get('ATTENDANCE_HOT_DAYS', 60))
+    for p in periods:
+        try:
+            moved = archive_period(p)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'  {p}: archived {moved} rows')
+    if not periods:
+        click.echo('Nothing to archive.')
+
+    archived = ArchivedPeriod.query.order_by(ArchivedPeriod.period).all()
+    click.echo(f'{len(archived)} archived periods, {sum(a.row_count for a in archived)} rows.')
+
+
+@click.command('restore-attendance')
+@click.argument('period')
+@with_appcontext
+def restore_attendance(period):
+    """Move an archived month (YYYY-MM) back into the attendance table."""
+    from app.archive import restore_period
+
+    try:
+        restored = restore_period(period)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'{period}: restored {restored} rows.')
+
+
+@click.command('rebuild-bitmaps')
+@with_appcontext
+def rebuild_bitmaps():
+    """Regenerate the per-student attendance bitmaps from the attendance tables."""
+    import time
+    from app.bitmaps import rebuild_bitmaps as rebuild
+
+    start = time.perf_counter()
+    count = rebuild()
+    click.echo(f'Rebuilt {count} bitmaps in {time.perf_counter() - start:.2f}s.')
+
+
+@click.command('camera-worker')
+@click.option('--camera-index', type=int, default=0, help='Camera device to open.')
+@with_appcontext
+def camera_worker(camera_index):
+    """
+    Own the camera in this process and publish annotated frames and
+    status to shared memory, for web workers running with CAMERA_WORKER.
+    """
+    import threading
+    import time
+    from app.framebuffer import FrameRing, MAX_PROFILES
+    from app.routes.camera import CameraSession, session_state
+    from app.streaming import stream_profiles, jpeg_encoder, encode_frame
+
+    config = current_app.config
+    ring = FrameRing.create(
+        config.get('CAMERA_SHM_NAME', 'hostel_attendance_camera'),
+        slots=config.get('CAMERA_RING_SLOTS', 8),
+        slot_bytes=config.get('CAMERA_RING_SLOT_BYTES', 512 * 1024),
+    )
+    profiles = list(stream_profiles(config).values())[:MAX_PROFILES]
+    encoder = jpeg_encoder(config)
+    click.echo(f'Camera worker ready on shared memory {ring.shm.name!r} '
+               f'(JPEG encoder: {encoder.backend}). Ctrl+C to exit.')
+    app = current_app._get_current_object()
+
+    # From a thread, so opening the camera or loading encodings does not look like a dead worker
+    stopping = threading.Event()
+
+    def heartbeat():
+        while not stopping.wait(1.0):
+            ring.beat()
+    beating = threading.Thread(target=heartbeat, daemon=True)
+    beating.start()
+    try:
+        while True:
+            control = ring.control()
+            if not control.get('running'):
+                time.sleep(0.2)
+                continue
+
+            session = CameraSession(department_id=control.get('department_id'),
+                                    tolerance=float(control.get('tolerance', 0.5)), app=app)
+            ok, err = session.start(camera_index)
+            if not ok:
+                ring.request(running=False)
+                ring.write_status({**session_state(None), 'messages': [err]})
+                click.echo(f'  {err}')
+                continue
+            click.echo('  Session started.')
+
+            for frame in session.frames():
+                # Encode only the profiles a web worker has asked for recently
+                for index in ring.watched_profiles():
+                    if index < len(profiles):
+                        jpeg = encode_frame(frame, profiles[index], encoder)
+                        if jpeg:
+                            ring.write_frame(jpeg, index)
+                ring.write_status(session_state(session))
+                if not ring.control().get('running'):
+                    break
+            session.stop()
+            ring.request(running=False)
+            ring.write_status(session_state(None))
+            click.echo('  Session stopped.')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopping.set()
+        beating.join()
+        ring.close()
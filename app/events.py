@@ -0,0 +1,76 @@
+import json
+import queue
+import threading
+
+
+def format_sse(event, data):
+    """Serialise one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventBroadcaster:
+    """
+    Fan out server-sent events to every connected browser.
+    Each subscriber gets its own bounded queue so a slow client
+    can never block the camera thread that publishes.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def publish(self, event, data):
+        message = format_sse(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # Drop the oldest message rather than stall the publisher
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def stream(self, initial=None, heartbeat=15):
+        """
+        Generator for a text/event-stream response.
+        `initial` is a list of (event, data) pairs sent on connect so the
+        client starts in sync; a comment line is sent every `heartbeat`
+        seconds to keep proxies from closing the connection.
+        """
+        q = self.subscribe()
+        try:
+            yield 'retry: 3000\n\n'
+            for event, data in initial or []:
+                yield format_sse(event, data)
+            while True:
+                try:
+                    yield q.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(q)
+
+
+# Camera session state changes and mark events
+camera_events = EventBroadcaster()
@@ -1,10 +1,13 @@
-import numpy as np
 import os
 import pickle
-import cv2
+import hashlib
+import threading
 from flask import current_app
 from datetime import datetime
 
+NO_FACE_ERROR = "No face detected in the image"
+MULTIPLE_FACES_ERROR = "Multiple faces detected. Please use an image with a single face"
+
 
 def allowed_file(filename):
     """Check if file extension is allowed."""
@@ -12,23 +15,130 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed
 
 
-def encode_face_from_image(image_path):
+def encode_face_from_image(image_path, cache=None, key=None):
     """
     Generate face encoding from an image file.
+    If an EncodingCache is given, identical photo content is only encoded once;
+    pass `key` when the caller has already hashed the photo.
     Returns encoding array or None if no face detected.
     """
+    if cache is not None:
+        key = key or cache.key_for(image_path)
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+
     import face_recognition
     try:
         image = face_recognition.load_image_file(image_path)
         encodings = face_recognition.face_encodings(image)
         if len(encodings) == 0:
-            return None, "No face detected in the image"
-        if len(encodings) > 1:
-            return None, "Multiple faces detected. Please use an image with a single face"
-        return encodings[0], None
+            result = None, NO_FACE_ERROR
+        elif len(encodings) > 1:
+            result = None, MULTIPLE_FACES_ERROR
+        else:
+            result = encodings[0], None
     except Exception as e:
+        # Unexpected failures (bad file, I/O) are not cached
         return None, str(e)
 
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def encoding_cache(config):
+    """The process-wide enrollment EncodingCache for this app config."""
+    settings = (config['ENCODING_CACHE_FOLDER'], config.get('ENCODING_CACHE_MAX_ENTRIES', 5000),
+                config.get('ENCODING_MODEL_VERSION', 'dlib-resnet-v1'))
+    with _caches_lock:
+        if settings not in _caches:
+            folder, max_entries, model_version = settings
+            _caches[settings] = EncodingCache(folder, max_entries=max_entries, model_version=model_version)
+        return _caches[settings]
+
+
+class EncodingCache:
+    """
+    On-disk cache of encode_face_from_image results keyed by the SHA-256
+    of the photo bytes and the encoding model version. The folder is
+    scanned once and the entry count tracked from then on; when it passes
+    `max_entries` by a tenth, least-recently-used entries are evicted back
+    down to `max_entries`, so the folder is listed once per that many writes.
+    """
+
+    def __init__(self, folder, max_entries=5000, model_version='dlib-resnet-v1'):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.model_version = model_version
+        self.evict_slack = max(1, max_entries // 10)
+        self._count = None  # entries on disk; None until the first write scans the folder
+        self._lock = threading.Lock()
+
+    def key_for(self, image_path):
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return f"{self.model_version}-{digest.hexdigest()}"
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.pkl")
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """Return the cached (encoding, error) pair, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            os.utime(path)  # mark as recently used
+            return result
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+
+    def put(self, key, result):
+        path = self._path(key)
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            new = not os.path.exists(path)
+            with open(path, 'wb') as f:
+                pickle.dump(result, f)
+        except OSError:
+            return
+        with self._lock:
+            if self._count is None:
+                self._count = len(self._entries())
+            elif new:
+                self._count += 1
+            if self._count > self.max_entries + self.evict_slack:
+                self._evict()
+
+    def _entries(self):
+        try:
+            return [e for e in os.scandir(self.folder) if e.name.endswith('.pkl')]
+        except OSError:
+            return []
+
+    def _evict(self):
+        entries = self._entries()
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        removed = 0
+        for entry in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+        # Recount from the listing; other processes may have written entries too
+        self._count = len(entries) - removed
+
 
 def save_encoding(encoding, student_id, encodings_folder):
     """Save face encoding to disk."""
@@ -70,37 +180,232 @@ def load_all_encodings(encodings_folder):
     return encodings
 
 
-def recognize_faces_in_frame(frame, known_encodings, tolerance=0.5):
+_gallery_cache = {}  # encodings_folder: (signature, keys, matrix)
+
+
+def load_gallery(encodings_folder):
+    """
+    Load all encodings as (keys, matrix) with one row per student, for
+    vectorised distance computation. The result is reused until a file
+    in the folder is added, removed or rewritten.
+    """
+    import numpy as np
+    if not os.path.exists(encodings_folder):
+        return [], np.empty((0, 128))
+
+    signature = tuple(sorted(
+        (e.name, e.stat().st_mtime_ns) for e in os.scandir(encodings_folder) if e.name.endswith('.pkl')
+    ))
+    cached = _gallery_cache.get(encodings_folder)
+    if cached and cached[0] == signature:
+        return cached[1], cached[2]
+
+    encodings = load_all_encodings(encodings_folder)
+    keys = list(encodings.keys())
+    matrix = np.array(list(encodings.values())) if keys else np.empty((0, 128))
+    _gallery_cache[encodings_folder] = (signature, keys, matrix)
+    return keys, matrix
+
+
+def find_duplicate_face(encoding, keys, matrix, tolerance, exclude=None):
+    """
+    Nearest-neighbour search of one encoding against the whole gallery.
+    Returns (student_id, distance) of the closest other student within
+    `tolerance`, or (None, None).
+    """
+    import numpy as np
+    if not keys:
+        return None, None
+    distances = np.linalg.norm(matrix - encoding, axis=1)
+    if exclude in keys:
+        distances[keys.index(exclude)] = np.inf
+    best = int(np.argmin(distances))
+    if distances[best] <= tolerance:
+        return keys[best], float(distances[best])
+    return None, None
+
+
+def find_close_pairs(matrix, tolerance, block_size=1024):
+    """
+    All-pairs audit of the gallery using blocked matrix distances, so
+    memory stays at block_size x N rather than N x N.
+    Returns sorted list of (i, j, distance) with i < j.
+    """
+    import numpy as np
+    matrix = np.asarray(matrix, dtype=np.float32)
+    sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+    limit = tolerance * tolerance
+    pairs = []
+    for start in range(0, len(matrix), block_size):
+        block = matrix[start:start + block_size]
+        # |a - b|^2 = |a|^2 + |b|^2 - 2ab, only against rows from `start` on
+        d2 = sq_norms[start:start + len(block), None] + sq_norms[None, start:] - 2 * block @ matrix[start:].T
+        rows, cols = np.nonzero(d2 <= limit)
+        for r, c in zip(rows, cols):
+            i, j = start + r, start + c
+            if i < j:
+                pairs.append((int(i), int(j), float(np.sqrt(max(d2[r, c], 0.0)))))
+    pairs.sort(key=lambda p: p[2])
+    return pairs
+
+
+EMBEDDING_SIZE = 128
+EMBEDDING_BYTES = EMBEDDING_SIZE * 4  # float32
+
+
+def parse_embeddings(data):
+    """
+    Decode a binary body of concatenated little-endian float32 embeddings
+    (512 bytes each). Returns an (n, 128) array, or None if the length is
+    not a whole number of embeddings or a value is NaN or infinite.
+    """
+    import numpy as np
+    if not data or len(data) % EMBEDDING_BYTES:
+        return None
+    embeddings = np.frombuffer(data, dtype='<f4').reshape(-1, EMBEDDING_SIZE)
+    if not np.isfinite(embeddings).all():
+        return None  # would come back as a NaN distance, which is not valid JSON
+    return embeddings.astype(np.float64)
+
+
+def encode_face_crops(images):
+    """
+    Encode tightly cropped face images (file-like JPEG/PNG), treating each
+    whole crop as the face so no detection pass is needed.
+    Returns a list of encodings with None for crops that failed.
+    """
+    if not images:
+        return []
+    import face_recognition
+    encodings = []
+    for image in images:
+        try:
+            pixels = face_recognition.load_image_file(image)
+            height, width = pixels.shape[:2]
+            found = face_recognition.face_encodings(pixels, known_face_locations=[(0, width, height, 0)])
+            encodings.append(found[0] if found else None)
+        except Exception:
+            encodings.append(None)
+    return encodings
+
+
+def match_encodings(encodings, keys, matrix, tolerance):
+    """
+    Match each encoding against the gallery: the nearest student within
+    `tolerance` wins, with confidence 1 - distance.
+    Returns a list of (student_key or None, confidence, distance).
+    """
+    import numpy as np
+    if not keys or not len(encodings):
+        return [(None, 0.0, None)] * len(encodings)
+    encodings = np.asarray(encodings, dtype=np.float64)
+    # |a - b|^2 = |a|^2 + |b|^2 - 2ab keeps memory at faces x gallery
+    d2 = (np.einsum('ij,ij->i', encodings, encodings)[:, None]
+          + np.einsum('ij,ij->i', matrix, matrix)[None, :] - 2 * encodings @ matrix.T)
+    distances = np.sqrt(np.maximum(d2, 0.0))
+    best = np.argmin(distances, axis=1)
+    matches = []
+    for row, idx in enumerate(best):
+        distance = float(distances[row, idx])
+        if distance <= tolerance:
+            matches.append((keys[idx], 1.0 - distance, distance))
+        else:
+            matches.append((None, 0.0, distance))
+    return matches
+
+
+def quality_settings(config):
+    """
+    Build the face quality gate settings from app config.
+    Returns None when the gate is disabled.
+    """
+    if not config.get('FACE_QUALITY_GATE', True):
+        return None
+    return {
+        'min_size': config.get('FACE_MIN_SIZE', 60),
+        'blur_threshold': config.get('FACE_BLUR_THRESHOLD', 40.0),
+        'max_yaw': config.get('FACE_MAX_YAW', 0.35),
+    }
+
+
+def assess_face_quality(rgb_frame, face_location, min_size=60, blur_threshold=40.0,
+                        max_yaw=0.35, scale=1):
+    """
+    Cheap checks run before the expensive 128-d encoding.
+    `min_size` is in original frame pixels; `scale` is how much the
+    frame was shrunk before detection. Returns None if the face is
+    worth encoding, otherwise the rejection reason.
+    """
+    import cv2
+    import numpy as np
+    top, right, bottom, left = face_location
+    if min(bottom - top, right - left) * scale < min_size:
+        return 'too_small'
+
+    crop = rgb_frame[max(top, 0):bottom, max(left, 0):right]
+    if crop.size == 0:
+        return 'too_small'
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    if cv2.Laplacian(gray, cv2.CV_64F).var() < blur_threshold:
+        return 'blurry'
+
+    # 5-point landmarks: nose should sit between the eyes for a frontal face
+    import face_recognition
+    landmarks = face_recognition.face_landmarks(rgb_frame, [face_location], model='small')
+    if not landmarks:
+        return 'pose'
+    points = landmarks[0]
+    left_eye = np.mean(points['left_eye'], axis=0)
+    right_eye = np.mean(points['right_eye'], axis=0)
+    nose = np.mean(points['nose_tip'], axis=0)
+    eye_dist = np.linalg.norm(right_eye - left_eye)
+    if eye_dist < 0.2 * (right - left):
+        return 'pose'
+    yaw = abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_dist
+    if yaw > max_yaw:
+        return 'pose'
+    return None
+
+
+def recognize_faces_in_frame(frame, known_encodings, tolerance=0.5, quality=None):
     """
     Detect and recognize faces in a single frame.
+    `quality` is a dict of assess_face_quality settings; faces that fail
+    it are returned as Unknown with a 'rejected' reason and never encoded.
     Returns list of dicts: [{name, student_db_id, confidence, location}]
     """
+    import cv2
+    import numpy as np
     import face_recognition
     # Resize frame for faster processing
     small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
     rgb_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
 
     face_locations = face_recognition.face_locations(rgb_frame)
-    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+
+    rejected = {}
+    if quality is not None:
+        for face_location in face_locations:
+            reason = assess_face_quality(rgb_frame, face_location, scale=2, **quality)
+            if reason:
+                rejected[face_location] = reason
+    accepted = [loc for loc in face_locations if loc not in rejected]
+    encoded = dict(zip(accepted, face_recognition.face_encodings(rgb_frame, accepted)))
+
+    keys = list(known_encodings.keys()) if known_encodings else []
+    matrix = np.array(list(known_encodings.values())) if keys else np.empty((0, 128))
+    matches = dict(zip(encoded, match_encodings(list(encoded.values()), keys, matrix, tolerance)))
 
     results = []
-    for face_encoding, face_location in zip(face_encodings, face_locations):
+    for face_location in face_locations:
         name = "Unknown"
         student_db_key = None
         confidence = 0.0
 
-        if known_encodings:
-            keys = list(known_encodings.keys())
-            enc_list = list(known_encodings.values())
-
-            distances = face_recognition.face_distance(enc_list, face_encoding)  # noqa
-            best_match_idx = np.argmin(distances)
-            best_distance = distances[best_match_idx]
-
-            if best_distance <= tolerance:
-                name = keys[best_match_idx]
-                student_db_key = keys[best_match_idx]
-                confidence = 1.0 - best_distance
+        match = matches.get(face_location)
+        if match and match[0] is not None:
+            name = student_db_key = match[0]
+            confidence = match[1]
 
         # Scale back up face locations (we resized by 0.5)
         top, right, bottom, left = face_location
@@ -109,12 +414,15 @@ def recognize_faces_in_frame(frame, known_encodings, tolerance=0.5):
         bottom *= 2
         left *= 2
 
-        results.append({
+        result = {
             'name': name,
             'student_db_key': student_db_key,
             'confidence': confidence,
             'location': (top, right, bottom, left)
-        })
+        }
+        if face_location in rejected:
+            result['rejected'] = rejected[face_location]
+        results.append(result)
 
     return results
 
@@ -124,6 +432,7 @@ def draw_recognition_results(frame, results, student_names):
     Draw bounding boxes and name labels on a frame.
     student_names: dict {student_id_string: full_name}
     """
+    import cv2
     for result in results:
         top, right, bottom, left = result['location']
         name = result['name']
@@ -133,6 +442,10 @@ def draw_recognition_results(frame, results, student_names):
             display_name = student_names[name]
             color = (0, 255, 0)  # Green for recognized
             label = f"{display_name} ({confidence*100:.1f}%)"
+        elif result.get('rejected'):
+            display_name = "Unknown"
+            color = (0, 165, 255)  # Orange for low quality
+            label = f"Low quality: {result['rejected']}"
         else:
             display_name = "Unknown"
             color = (0, 0, 255)  # Red for unknown
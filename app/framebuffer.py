@@ -0,0 +1,248 @@
+"""
+Shared-memory ring buffer between the camera worker and web workers.
+
+`flask camera-worker` owns the camera and writes every annotated JPEG
+frame and the session status into one named shared-memory segment. Web
+worker processes attach to it to serve /camera/feed and /camera/status,
+and ask the worker to start or stop through a small control area.
+
+Layout: header | viewer timestamps | control (JSON) | status (JSON) | N
+frame slots. Every area carries a sequence number that is cleared while
+it is written, so readers can detect a torn read and retry instead of
+taking a lock. Frames and status have a single writer, the worker; the
+control area is written by every web worker as well, so those writes
+take a file lock. Each frame is tagged with its stream profile; readers
+stamp the profile they watch so the worker encodes only those. The
+worker stamps a heartbeat in the header, and a ring whose heartbeat is
+older than a few seconds belongs to a dead worker.
+"""
+import json
+import os
+import struct
+import tempfile
+import time
+
+MAGIC = b'HSR3'
+MAX_PROFILES = 8
+_HEADER = struct.Struct('<4sIIIIdQ')  # magic, slots, slot_bytes, control_bytes, status_bytes, heartbeat, latest seq
+_HEARTBEAT_AT = _HEADER.size - 16
+_LATEST_AT = _HEADER.size - 8
+_VIEWS = struct.Struct(f'<{MAX_PROFILES}d')  # last time a reader asked for each profile
+_AREA = struct.Struct('<QI')  # seq, payload length
+
+
+def _open(name, create=False, size=0):
+    from multiprocessing import shared_memory
+    if create:
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: stop the resource tracker unlinking a segment we only attached to
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class _FileLock:
+    """Exclusive lock on a file, held between processes for the duration of a `with` block."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+b')
+        if os.name == 'nt':
+            import msvcrt
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+class FrameRing:
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        magic, self.slots, self.slot_bytes, self.control_bytes, self.status_bytes, _, _ = \
+            _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{shm.name} is not a camera frame ring')
+        self._control_at = _HEADER.size + _VIEWS.size
+        self._status_at = self._control_at + _AREA.size + self.control_bytes
+        self._slots_at = self._status_at + _AREA.size + self.status_bytes
+        self._control_lock = _FileLock(os.path.join(tempfile.gettempdir(), f'{shm.name.lstrip("/")}.control.lock'))
+        self._control = None
+        self._seq = 0
+        self._status = None
+
+    @classmethod
+    def create(cls, name, slots=8, slot_bytes=512 * 1024, control_bytes=1024, status_bytes=16 * 1024):
+        """Create the segment (replacing a stale one left by a crashed worker)."""
+        try:
+            stale = _open(name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        size = (_HEADER.size + _VIEWS.size + 2 * _AREA.size + control_bytes + status_bytes
+                + slots * (_AREA.size + 1 + slot_bytes))
+        shm = _open(name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        _HEADER.pack_into(shm.buf, 0, MAGIC, slots, slot_bytes, control_bytes, status_bytes, time.time(), 0)
+        ring = cls(shm, owner=True)
+        ring.request(running=False)
+        ring.write_status({'running': False, 'marked_count': 0, 'messages': []})
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to the worker's segment, or None if no worker is running."""
+        try:
+            return cls(_open(name))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # Seqlocked areas
+
+    def _write_area(self, offset, capacity, payload, seq, prefix=b''):
+        length = len(prefix) + len(payload)
+        if length > capacity:
+            raise ValueError(f'{length} bytes does not fit in {capacity}')
+        buf = self.shm.buf
+        start = offset + _AREA.size
+        _AREA.pack_into(buf, offset, 0, 0)  # readers retry while seq is 0
+        buf[start:start + len(prefix)] = prefix
+        buf[start + len(prefix):start + length] = payload
+        _AREA.pack_into(buf, offset, seq, length)
+
+    def _read_area(self, offset, retries=50):
+        buf = self.shm.buf
+        for _ in range(retries):
+            seq, length = _AREA.unpack_from(buf, offset)
+            if not seq:
+                time.sleep(0.0005)
+                continue
+            payload = bytes(buf[offset + _AREA.size:offset + _AREA.size + length])
+            if _AREA.unpack_from(buf, offset)[0] == seq:
+                return seq, payload
+        return 0, b''
+
+    def _read_json(self, offset, retries=50):
+        seq, payload = self._read_area(offset, retries)
+        return seq, (json.loads(payload) if payload else {})
+
+    # Frames (worker writes, web workers read)
+
+    def _slot_at(self, seq):
+        return self._slots_at + (seq % self.slots) * (_AREA.size + 1 + self.slot_bytes)
+
+    def write_frame(self, jpeg, profile=0):
+        """Publish one encoded frame for a stream profile. Returns its sequence number."""
+        _check_profile(profile)
+        seq = struct.unpack_from('<Q', self.shm.buf, _LATEST_AT)[0] + 1
+        self._write_area(self._slot_at(seq), self.slot_bytes + 1, jpeg, seq, prefix=bytes([profile]))
+        struct.pack_into('<Q', self.shm.buf, _LATEST_AT, seq)
+        return seq
+
+    def latest_frame(self, profile=0):
+        """(seq, jpeg) of the newest complete frame for `profile`, or (0, b'') if none yet."""
+        buf = self.shm.buf
+        latest = struct.unpack_from('<Q', buf, _LATEST_AT)[0]
+        for seq in range(latest, max(latest - self.slots, 0), -1):
+            offset = self._slot_at(seq)
+            if buf[offset + _AREA.size] != profile:
+                continue  # skip copying frames encoded for other viewers
+            got, payload = self._read_area(offset, retries=1)
+            if got == seq and payload[0] == profile:
+                return seq, payload[1:]
+        return 0, b''
+
+    # Viewers (web workers stamp, worker reads)
+
+    def touch(self, profile=0):
+        """Note that someone is watching `profile` right now."""
+        _check_profile(profile)
+        struct.pack_into('<d', self.shm.buf, _HEADER.size + 8 * profile, time.time())
+
+    def watched_profiles(self, within=2.0):
+        """Profiles a reader has asked for in the last `within` seconds."""
+        now = time.time()
+        return [i for i, seen in enumerate(_VIEWS.unpack_from(self.shm.buf, _HEADER.size)) if now - seen <= within]
+
+    # Heartbeat (worker writes every second or so)
+
+    def beat(self):
+        """Note that the worker process is alive."""
+        struct.pack_into('<d', self.shm.buf, _HEARTBEAT_AT, time.time())
+
+    def alive(self, within=5.0):
+        """Whether the worker has stamped its heartbeat in the last `within` seconds."""
+        return time.time() - struct.unpack_from('<d', self.shm.buf, _HEARTBEAT_AT)[0] <= within
+
+    # Status (worker writes) and control (web workers and the worker write, under a lock)
+
+    def write_status(self, status):
+        """Publish the session status; a no-op when it has not changed."""
+        payload = json.dumps(status).encode()
+        if payload == self._status:
+            return
+        self._seq += 1
+        self._write_area(self._status_at, self.status_bytes, payload, self._seq)
+        self._status = payload
+
+    def read_status(self):
+        """(seq, status dict); seq changes whenever the worker publishes."""
+        return self._read_json(self._status_at)
+
+    def request(self, **control):
+        """Ask the worker to change state, e.g. request(running=True, tolerance=0.5)."""
+        payload = json.dumps(control).encode()
+        with self._control_lock:
+            seq = _AREA.unpack_from(self.shm.buf, self._control_at)[0] + 1
+            self._write_area(self._control_at, self.control_bytes, payload, seq)
+        self._control = control
+
+    def control(self, timeout=1.0):
+        """
+        The last requested state. A read that keeps landing on a write in
+        progress is retried for `timeout` seconds, then answered with the
+        last state this ring saw; an empty dict would read as a stop.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            seq, control = self._read_json(self._control_at)
+            if seq:
+                self._control = control
+                return control
+            if time.monotonic() >= deadline:
+                if self._control is None:
+                    raise TimeoutError(f'control area of {self.shm.name} is being rewritten')
+                return self._control
+
+
+def _check_profile(profile):
+    if not 0 <= profile < MAX_PROFILES:
+        raise ValueError(f'profile index {profile} is outside 0..{MAX_PROFILES - 1}')
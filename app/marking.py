@@ -0,0 +1,275 @@
+"""
+Set-based attendance marking shared by the batch API and remote gates,
+and the day-scoped cache of who is already marked.
+"""
+import math
+import threading
+import time
+from datetime import date, datetime
+from flask import current_app
+from app import db
+from app.models import Attendance, AttendanceArchive, Student, Department
+
+
+def record_marks(marks, default_department=None, department_from_student=False):
+    """
+    Write many marks in one transaction. Each mark is a dict with
+    student_db_id and optional timestamp (ISO string or datetime),
+    confidence, department_id, idempotency_key and marked_by.
+    Confidence must be a number and department_id an integer naming a
+    department; a mark that fails either gets an error result. Students,
+    departments, idempotency keys seen before (archived rows included)
+    and existing rows are fetched with one query each. With `department_from_student`, marks
+    without a department use the department named on the student, as
+    the camera does. Returns one result dict per mark with status
+    marked, duplicate (key seen before), already_marked or error.
+    Raises if the write fails; nothing is committed in that case.
+    """
+    results = [None] * len(marks)
+    items = []
+    for index, mark in enumerate(marks):
+        key = mark.get('idempotency_key') if isinstance(mark, dict) else None
+        key = str(key) if key else None
+        if not isinstance(mark, dict) or not mark.get('student_db_id'):
+            results[index] = {'index': index, 'idempotency_key': key, 'status': 'error',
+                              'error': 'student_db_id required'}
+            continue
+        stamp = mark.get('timestamp') or datetime.now()
+        if not isinstance(stamp, datetime):
+            try:
+                stamp = datetime.fromisoformat(stamp)
+            except (TypeError, ValueError):
+                results[index] = {'index': index, 'idempotency_key': key, 'status': 'error',
+                                  'error': 'Invalid timestamp'}
+                continue
+        try:
+            mark = dict(mark, confidence=_number(mark.get('confidence', 0.0)),
+                        department_id=_integer(mark.get('department_id', default_department)))
+        except ValueError as e:
+            results[index] = {'index': index, 'idempotency_key': key, 'status': 'error', 'error': str(e)}
+            continue
+        items.append((index, mark, stamp, key))
+
+    # One query each for students, departments, previously seen keys and existing rows
+    roll_numbers = {str(mark['student_db_id']) for _, mark, _, _ in items}
+    students = {s.student_id: s for s in Student.query.filter(Student.student_id.in_(roll_numbers))} \
+        if roll_numbers else {}
+    department_ids = {mark['department_id'] for _, mark, _, _ in items if mark['department_id'] is not None}
+    known_departments = {d for d, in db.session.query(Department.id).filter(Department.id.in_(department_ids))} \
+        if department_ids else set()
+    keys = {key for _, _, _, key in items if key}
+    seen_keys, archived_keys = {}, set()
+    if keys:
+        seen_keys = dict(db.session.query(Attendance.idempotency_key, Attendance.id)
+                         .filter(Attendance.idempotency_key.in_(keys)))
+        archived_keys = {k for k, in db.session.query(AttendanceArchive.idempotency_key)
+                         .filter(AttendanceArchive.idempotency_key.in_(keys))}
+    dates = {stamp.date() for _, _, stamp, _ in items}
+    marked = set(db.session.query(Attendance.student_id, Attendance.date, Attendance.department_id).filter(
+        Attendance.student_id.in_([s.id for s in students.values()]), Attendance.date.in_(dates)
+    ).tuples()) if students else set()
+    departments = {}
+    if department_from_student:
+        names = {s.department for s in students.values() if s.department}
+        if names:
+            departments = dict(db.session.query(Department.name, Department.id)
+                               .filter(Department.name.in_(names)).tuples())
+
+    records, results_by_record, pending = [], [], {}
+    for index, mark, stamp, key in items:
+        result = {'index': index, 'idempotency_key': key}
+        results[index] = result
+        if key and key in seen_keys:
+            result.update(status='duplicate', record_id=seen_keys[key])
+            continue
+        if key and key in archived_keys:
+            result.update(status='duplicate', archived=True)
+            continue
+        if key and key in pending:
+            result['status'] = 'duplicate'
+            results_by_record.append((result, pending[key]))
+            continue
+        student = students.get(str(mark['student_db_id']))
+        if not student:
+            result.update(status='error', error='Student not found')
+            continue
+        department_id = mark['department_id']
+        if department_id is not None and department_id not in known_departments:
+            result.update(status='error', error='Department not found')
+            continue
+        if department_id is None and department_from_student:
+            department_id = departments.get(student.department)
+        slot = (student.id, stamp.date(), department_id)
+        if slot in marked:
+            result.update(status='already_marked')
+            continue
+
+        record = Attendance(
+            student_id=student.id,
+            department_id=department_id,
+            date=stamp.date(),
+            time_in=stamp.time(),
+            status='present',
+            confidence=mark['confidence'],
+            marked_by=mark.get('marked_by', 'face_recognition'),
+            idempotency_key=key
+        )
+        result['status'] = 'marked'
+        records.append(record)
+        results_by_record.append((result, record))
+        marked.add(slot)
+        if key:
+            pending[key] = record
+
+    try:
+        db.session.add_all(records)
+        db.session.flush()
+        # Read ids before commit expires the objects (saves a reload per record)
+        for result, record in results_by_record:
+            result['record_id'] = record.id
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    cache = marked_cache()
+    rolls = {s.id: s.student_id for s in students.values()}
+    for student_id, day, department_id in marked:
+        if student_id in rolls:
+            cache.add(rolls[student_id], department_id, day=day)
+    return results
+
+
+def _number(value):
+    """A mark's confidence as a float; None stays None."""
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = None
+    if isinstance(value, bool) or number is None or not math.isfinite(number):
+        raise ValueError('confidence must be a number')
+    return number
+
+
+def _integer(value):
+    """A mark's department_id as an int; None stays None."""
+    if value is None:
+        return None
+    try:
+        number = int(value) if isinstance(value, str) else value
+    except ValueError:
+        number = None
+    if isinstance(number, float) and number.is_integer():
+        number = int(number)
+    if isinstance(number, bool) or not isinstance(number, int):
+        raise ValueError('department_id must be an integer')
+    return number
+
+
+def count_results(results):
+    """{status: count} for a list of record_marks results."""
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return counts
+
+
+_UNKNOWN = object()
+
+
+class MarkedToday:
+    """
+    Process-wide set of (roll number, department_id) pairs that already
+    have an attendance row today, so repeat sightings are answered from
+    memory. Also remembers each marked student's home department, which
+    the camera uses when a session has no department. Warmed with one
+    query at startup and emptied when the date changes. Marks written by
+    other processes are not seen, which only costs a DB check; rows they
+    delete are caught by confirming a pair with one EXISTS query at most
+    every `recheck` seconds, so hits in between issue no queries.
+    Students deleted or moved to another department are forgotten.
+    """
+
+    def __init__(self, recheck=60):
+        self._lock = threading.Lock()
+        self.recheck = recheck
+        self.day = None
+        self._pairs = {}  # (roll number, department_id): monotonic time the row was last known to exist
+        self._home = {}  # roll number: department_id resolved from the student's department name
+
+    def warm(self):
+        """Load today's marks with one query."""
+        today = date.today()
+        rows = db.session.query(Student.student_id, Attendance.department_id, Department.id) \
+            .join(Student, Attendance.student_id == Student.id) \
+            .outerjoin(Department, Department.name == Student.department) \
+            .filter(Attendance.date == today).all()
+        now = time.monotonic()
+        with self._lock:
+            self.day = today
+            self._pairs = {(roll, department_id): now for roll, department_id, _ in rows}
+            self._home.update((roll, home) for roll, _, home in rows)
+
+    def _rollover(self):
+        today = date.today()
+        if self.day != today:
+            self.day = today
+            self._pairs = {}
+
+    def contains(self, roll, department_id):
+        """Whether the student has a row in the department today; hits are re-confirmed in the DB once per `recheck` seconds."""
+        with self._lock:
+            self._rollover()
+            day = self.day
+            checked = self._pairs.get((roll, department_id))
+            if checked is None:
+                return False
+            if time.monotonic() - checked < self.recheck:
+                return True
+        if _marked_on(roll, department_id, day):
+            self.add(roll, department_id, day=day)
+            return True
+        self.discard(roll, department_id, day=day)  # deleted since, possibly by another process
+        return False
+
+    def home_department(self, roll):
+        """(known, department_id) for a student seen before."""
+        with self._lock:
+            return roll in self._home, self._home.get(roll)
+
+    def add(self, roll, department_id, home=_UNKNOWN, day=None):
+        with self._lock:
+            self._rollover()
+            if day is None or day == self.day:
+                self._pairs[(roll, department_id)] = time.monotonic()
+            if home is not _UNKNOWN:
+                self._home[roll] = home
+
+    def discard(self, roll, department_id, day=None):
+        with self._lock:
+            self._rollover()
+            if day is None or day == self.day:
+                self._pairs.pop((roll, department_id), None)
+
+    def forget(self, roll):
+        """Drop everything known about a student, e.g. after it is deleted or changes department."""
+        with self._lock:
+            self._pairs = {pair: checked for pair, checked in self._pairs.items() if pair[0] != roll}
+            self._home.pop(roll, None)
+
+
+def _marked_on(roll, department_id, day):
+    """One EXISTS query: does the student have a row in the department on `day`?"""
+    department = Attendance.department_id.is_(None) if department_id is None \
+        else Attendance.department_id == department_id
+    return db.session.query(
+        Attendance.query.join(Student, Attendance.student_id == Student.id)
+        .filter(Student.student_id == roll, Attendance.date == day, department).exists()
+    ).scalar()
+
+
+def marked_cache():
+    """The current app's MarkedToday cache."""
+    return current_app.extensions['marked_today']
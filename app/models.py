@@ -1,4 +1,5 @@
 from app import db
+from app.thumbnails import thumbnail_name
 from datetime import datetime
 
 
@@ -19,6 +20,8 @@ class Student(db.Model):
 
     # Relationships
     attendances = db.relationship('Attendance', backref='student', lazy=True, cascade='all, delete-orphan')
+    archived_attendances = db.relationship('AttendanceArchive', backref='student', lazy=True,
+                                           cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
@@ -31,9 +34,14 @@ class Student(db.Model):
             'photo_path': self.photo_path,
             'is_active': self.is_active,
             'has_face_data': self.encoding_path is not None,
+            'thumbnail_name': self.thumbnail_name,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+    @property
+    def thumbnail_name(self):
+        return thumbnail_name(self.photo_path)
+
     def __repr__(self):
         return f'<Student {self.student_id}: {self.name}>'
 
@@ -50,6 +58,7 @@ class Department(db.Model):
 
     # Relationships
     attendances = db.relationship('Attendance', backref='department', lazy=True)
+    archived_attendances = db.relationship('AttendanceArchive', backref='department', lazy=True)
 
     def to_dict(self):
         return {
@@ -75,6 +84,7 @@ class Attendance(db.Model):
     status = db.Column(db.String(20), default='present')  # present, absent, late
     confidence = db.Column(db.Float, nullable=True)
     marked_by = db.Column(db.String(50), default='face_recognition')
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=True)  # set by batch clients
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def to_dict(self):
@@ -95,3 +105,61 @@ class Attendance(db.Model):
 
     def __repr__(self):
         return f'<Attendance Student:{self.student_id} Date:{self.date}>'
+
+
+class AttendanceArchive(db.Model):
+    """Attendance rows from closed months, moved out of the hot table by `flask archive-attendance`."""
+    __tablename__ = 'attendance_archive'
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(7), nullable=False, index=True)  # YYYY-MM
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    time_in = db.Column(db.Time, nullable=True)
+    status = db.Column(db.String(20), default='present')
+    confidence = db.Column(db.Float, nullable=True)
+    marked_by = db.Column(db.String(50), default='face_recognition')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=True)  # kept so replays stay duplicates
+
+    to_dict = Attendance.to_dict
+
+    def __repr__(self):
+        return f'<AttendanceArchive Student:{self.student_id} Date:{self.date}>'
+
+
+class ArchivedPeriod(db.Model):
+    __tablename__ = 'archived_periods'
+
+    period = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    row_count = db.Column(db.Integer, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat(),
+            'row_count': self.row_count,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None
+        }
+
+    def __repr__(self):
+        return f'<ArchivedPeriod {self.period}: {self.row_count} rows>'
+
+
+class AttendanceBitmap(db.Model):
+    """One bit per day of `year` for days on which a student has a row with `status` in a block."""
+    __tablename__ = 'attendance_bitmaps'
+
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    department_id = db.Column(db.Integer, primary_key=True, default=0)  # 0: row without a block
+    status = db.Column(db.String(20), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    bits = db.Column(db.LargeBinary, nullable=False)  # little-endian, bit n = day n of the year
+
+    def __repr__(self):
+        return f'<AttendanceBitmap Student:{self.student_id} Dept:{self.department_id} {self.status} {self.year}>'
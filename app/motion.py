@@ -0,0 +1,67 @@
+import time
+import cv2
+import numpy as np
+
+
+def motion_settings(config):
+    """
+    Build MotionDetector settings from app config.
+    Returns None when the motion gate is disabled.
+    """
+    if not config.get('MOTION_GATE', True):
+        return None
+    return {
+        'roi': config.get('MOTION_ROI'),
+        'threshold': config.get('MOTION_THRESHOLD', 0.01),
+        'pixel_delta': config.get('MOTION_PIXEL_DELTA', 25),
+        'hold_seconds': config.get('MOTION_HOLD_SECONDS', 2.0),
+    }
+
+
+class MotionDetector:
+    """
+    Cheap background-subtraction gate in front of face detection.
+    Works on a small grayscale copy of the region of interest and keeps
+    a running-average background, so an idle corridor costs one resize
+    and one absdiff per frame.
+    """
+
+    def __init__(self, roi=None, threshold=0.01, pixel_delta=25, hold_seconds=2.0,
+                 learning_rate=0.05, width=160):
+        self.roi = roi  # (x, y, w, h) as fractions of the frame, or None for the whole frame
+        self.threshold = threshold  # fraction of ROI pixels that must change
+        self.pixel_delta = pixel_delta
+        self.hold_seconds = hold_seconds  # keep processing this long after motion stops
+        self.learning_rate = learning_rate
+        self.width = width
+        self._background = None
+        self._last_motion = None
+
+    def _prepare(self, frame):
+        if self.roi:
+            h, w = frame.shape[:2]
+            x, y, rw, rh = self.roi
+            frame = frame[int(y * h):int((y + rh) * h), int(x * w):int((x + rw) * w)]
+        scale = self.width / frame.shape[1]
+        small = cv2.resize(frame, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def update(self, frame):
+        """Feed a BGR frame; returns True while recognition should run."""
+        now = time.monotonic()
+        gray = self._prepare(frame)
+
+        if self._background is None:
+            # No background yet: treat the first frame as motion
+            self._background = gray.astype(np.float32)
+            self._last_motion = now
+            return True
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        changed = np.count_nonzero(diff > self.pixel_delta) / diff.size
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+
+        if changed >= self.threshold:
+            self._last_motion = now
+        return now - self._last_motion <= self.hold_seconds
@@ -0,0 +1,107 @@
+"""
+Opt-in request profiling and SQL instrumentation.
+
+- Slow-query log: statements slower than SLOW_QUERY_MS are logged with
+  their timing and (shortened) parameters.
+- N+1 warning: requests over QUERY_COUNT_WARN queries are logged.
+- With PROFILING_ENABLED only: responses carry X-Query-Count /
+  X-Query-Time-Ms, per-endpoint totals are kept for /_debug/query-stats
+  (requests that match no route share one '<unmatched>' entry), and a
+  request sent with `X-Profile: 1` or `?_profile=1` runs under cProfile
+  with the stats written to PROFILE_FOLDER (open them with
+  `python -m pstats` or snakeviz).
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from flask import g, request, jsonify, has_request_context
+
+_stats_lock = threading.Lock()
+_endpoint_stats = {}  # endpoint: {'requests', 'queries', 'query_ms', 'max_queries'}
+_UNMATCHED = '<unmatched>'
+_PARAMS_LOGGED = 500  # characters of a slow query's parameters that reach the log
+
+
+def _short_params(parameters, executemany):
+    """Parameters for the slow-query log, cut short so a bulk insert does not flood it."""
+    text = repr(parameters)
+    if executemany:
+        text = f'{len(parameters)} rows, first {parameters[0]!r}' if parameters else text
+    return text if len(text) <= _PARAMS_LOGGED else text[:_PARAMS_LOGGED] + '...'
+
+
+def init_profiling(app, engine):
+    """Attach the SQL listeners to `engine` and the request hooks to `app`."""
+    import sqlalchemy as sa
+    slow_ms = app.config.get('SLOW_QUERY_MS', 200)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = (time.perf_counter() - conn.info['query_start'].pop()) * 1000
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+            g.query_ms = g.get('query_ms', 0.0) + elapsed
+        if slow_ms is not None and elapsed >= slow_ms:
+            app.logger.warning('Slow query (%.1f ms): %s | params=%s', elapsed, statement,
+                               _short_params(parameters, executemany))
+
+    sa.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    sa.event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def _start_profile():
+        g.query_count = 0
+        g.query_ms = 0.0
+        if app.config.get('PROFILING_ENABLED') and (
+            request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1'
+        ):
+            import cProfile
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def _finish_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            folder = app.config['PROFILE_FOLDER']
+            os.makedirs(folder, exist_ok=True)
+            name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{(request.endpoint or 'unknown').replace('.', '-')}.prof"
+            profiler.dump_stats(os.path.join(folder, name))
+            response.headers['X-Profile-File'] = name
+
+        count, query_ms = g.get('query_count', 0), g.get('query_ms', 0.0)
+        # Keyed by route, never by URL, so scanners probing random paths cannot grow the table
+        endpoint = request.endpoint or _UNMATCHED
+        if app.config.get('PROFILING_ENABLED'):
+            response.headers['X-Query-Count'] = str(count)
+            response.headers['X-Query-Time-Ms'] = f'{query_ms:.1f}'
+            with _stats_lock:
+                stats = _endpoint_stats.setdefault(
+                    endpoint, {'requests': 0, 'queries': 0, 'query_ms': 0.0, 'max_queries': 0})
+                stats['requests'] += 1
+                stats['queries'] += count
+                stats['query_ms'] += query_ms
+                stats['max_queries'] = max(stats['max_queries'], count)
+        if count >= app.config.get('QUERY_COUNT_WARN', 50):
+            app.logger.warning('%s ran %d queries (%.1f ms) - possible N+1', endpoint, count, query_ms)
+        return response
+
+    if app.config.get('PROFILING_ENABLED'):
+        app.add_url_rule('/_debug/query-stats', 'query_stats', query_stats)
+
+
+def query_stats():
+    """Per-endpoint query counts since startup, most queries per request first."""
+    with _stats_lock:
+        rows = [
+            {'endpoint': endpoint, **stats,
+             'avg_queries': round(stats['queries'] / stats['requests'], 1),
+             'query_ms': round(stats['query_ms'], 1)}
+            for endpoint, stats in _endpoint_stats.items()
+        ]
+    rows.sort(key=lambda r: r['avg_queries'], reverse=True)
+    return jsonify(rows)
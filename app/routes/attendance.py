@@ -1,6 +1,7 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app
 from app.models import Attendance, Student, Department
 from app import db
+from app.marking import record_marks, count_results, marked_cache
 from datetime import date, datetime
 
 attendance_bp = Blueprint('attendance', __name__)
@@ -9,8 +10,8 @@ attendance_bp = Blueprint('attendance', __name__)
 @attendance_bp.route('/')
 def list_attendance():
     departments = Department.query.order_by(Department.name).all()
-    students = Student.query.filter_by(is_active=True).order_by(Student.name).all()
-    return render_template('attendance.html', departments=departments, students=students)
+    # Student pickers search /students/api/search as the user types
+    return render_template('attendance.html', departments=departments)
 
 
 @attendance_bp.route('/api/records')
@@ -57,6 +58,10 @@ def mark_attendance():
     if not student_db_id:
         return jsonify({'success': False, 'error': 'student_db_id required'}), 400
 
+    cache = marked_cache()
+    if cache.contains(str(student_db_id), department_id):
+        return jsonify({'success': False, 'error': 'Attendance already marked', 'already_marked': True})
+
     student = Student.query.filter_by(student_id=student_db_id).first()
     if not student:
         return jsonify({'success': False, 'error': 'Student not found'}), 404
@@ -69,6 +74,7 @@ def mark_attendance():
     ).first()
 
     if existing:
+        cache.add(student.student_id, department_id)
         return jsonify({'success': False, 'error': 'Attendance already marked', 'already_marked': True})
 
     record = Attendance(
@@ -82,10 +88,39 @@ def mark_attendance():
     )
     db.session.add(record)
     db.session.commit()
+    cache.add(student.student_id, department_id)
 
     return jsonify({'success': True, 'record': record.to_dict(), 'message': f"Attendance marked for {student.name}"})
 
 
+@attendance_bp.route('/api/mark_batch', methods=['POST'])
+def mark_attendance_batch():
+    """
+    Mark many students at once, e.g. a kiosk replaying marks after an outage.
+    Body: {"department_id": ..., "marks": [{"student_db_id", "timestamp",
+    "confidence", "department_id", "idempotency_key"}, ...]}. Lookups are
+    set-based and the batch is written in one transaction. Returns one
+    result per mark: marked, duplicate (key seen before), already_marked
+    or error.
+    """
+    data = request.get_json(silent=True) or {}
+    marks = data.get('marks')
+    default_department = data.get('department_id')
+    if not isinstance(marks, list) or not marks:
+        return jsonify({'success': False, 'error': 'marks list required'}), 400
+    limit = current_app.config.get('ATTENDANCE_BATCH_MAX', 1000)
+    if len(marks) > limit:
+        return jsonify({'success': False, 'error': f'At most {limit} marks per batch'}), 413
+
+    try:
+        results = record_marks(marks, default_department)
+    except Exception:
+        # Bad input is reported per mark; anything raised here is a database failure
+        current_app.logger.exception('Batch mark failed')
+        return jsonify({'success': False, 'error': 'Could not record marks'}), 500
+    return jsonify({'success': True, 'counts': count_results(results), 'results': results})
+
+
 @attendance_bp.route('/api/manual', methods=['POST'])
 def manual_mark():
     """Manually mark attendance for a student."""
@@ -130,14 +165,18 @@ def manual_mark():
     )
     db.session.add(record)
     db.session.commit()
+    marked_cache().add(student.student_id, department_id, day=mark_date)
     return jsonify({'success': True, 'record': record.to_dict(), 'message': 'Attendance marked manually'})
 
 
 @attendance_bp.route('/api/delete/<int:record_id>', methods=['DELETE'])
 def delete_record(record_id):
     record = Attendance.query.get_or_404(record_id)
+    roll = record.student.student_id if record.student else None
+    department_id, day = record.department_id, record.date
     db.session.delete(record)
     db.session.commit()
+    marked_cache().discard(roll, department_id, day=day)
     return jsonify({'success': True, 'message': 'Record deleted'})
 
 
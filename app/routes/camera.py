@@ -1,10 +1,11 @@
-import cv2
 import threading
-import numpy as np
+import time
 from flask import Blueprint, render_template, Response, request, jsonify, current_app
 from app.models import Student, Department
 from app import db
-from app.face_utils import load_all_encodings, recognize_faces_in_frame, draw_recognition_results
+from app.face_utils import (load_all_encodings, recognize_faces_in_frame, draw_recognition_results,
+                            quality_settings)
+from app.events import camera_events, format_sse
 from datetime import date, datetime
 
 camera_bp = Blueprint('camera', __name__)
@@ -24,9 +25,19 @@ class CameraSession:
         self.marked_today = set()  # student_db_keys already marked this session
         self.last_results = []
         self.status_messages = []
+        self.quality_rejects = {}  # reason: count of faces skipped before encoding
+        self.motion_active = False
+        self.idle_frames = 0  # frames skipped by the motion gate
         self.app = app
+        # Latest annotated frame, encoded lazily per stream profile by /feed viewers
+        self._frame = None
+        self._frame_seq = 0
+        self._frame_ready = threading.Condition()
+        self._encoded = {}  # profile: (frame seq, jpeg)
+        self._encode_locks = {}  # profile: Lock, so concurrent viewers encode a frame once
 
     def start(self, camera_index=0):
+        import cv2
         self.cap = cv2.VideoCapture(camera_index)
         if not self.cap.isOpened():
             return False, "Cannot open camera"
@@ -40,10 +51,44 @@ class CameraSession:
         if self.cap:
             self.cap.release()
             self.cap = None
-
-    def generate_frames(self):
-        """Generator that yields MJPEG frames."""
-        skip = 3
+        with self._frame_ready:
+            self._frame_ready.notify_all()
+
+    def run(self):
+        """Capture loop: keep the latest annotated frame for viewers; nothing is encoded here."""
+        for frame in self.frames():
+            with self._frame_ready:
+                self._frame = frame
+                self._frame_seq += 1
+                self._frame_ready.notify_all()
+
+    def stream(self, profile):
+        """MJPEG generator for one viewer; each frame is encoded at most once per profile."""
+        from app.streaming import stream_profiles, jpeg_encoder, encode_frame
+        settings = stream_profiles(self.app.config)[profile]
+        encoder = jpeg_encoder(self.app.config)
+        lock = self._encode_locks.setdefault(profile, threading.Lock())
+        last = 0
+        while self.running:
+            with self._frame_ready:
+                if self._frame_seq == last:
+                    self._frame_ready.wait(timeout=1.0)
+                seq, frame = self._frame_seq, self._frame
+            if seq == last or frame is None:
+                continue
+            last = seq
+            with lock:
+                cached = self._encoded.get(profile)
+                if not cached or cached[0] != seq:
+                    cached = (seq, encode_frame(frame, settings, encoder))
+                    self._encoded[profile] = cached
+            if cached[1]:
+                yield _multipart(cached[1])
+
+    def frames(self):
+        """Generator that yields annotated BGR frames; encoding is left to the consumer."""
+        from app.motion import MotionDetector, motion_settings
+        skip = self.app.config.get('FRAME_SKIP', 3)
         frame_idx = 0
         known_encodings = {}
         student_names = {}
@@ -52,6 +97,13 @@ class CameraSession:
             known_encodings = load_all_encodings(self.app.config['ENCODINGS_FOLDER'])
             students = Student.query.filter_by(is_active=True).all()
             student_names = {s.student_id: s.name for s in students}
+        quality = quality_settings(self.app.config)
+        min_confidence = self.app.config.get('MARK_MIN_CONFIDENCE', 0.6)
+        motion = motion_settings(self.app.config)
+        detector = MotionDetector(**motion) if motion else None
+        if detector:
+            # Motion-triggered frames are processed at this (faster) rate
+            skip = self.app.config.get('MOTION_ACTIVE_SKIP', 1)
 
         while self.running and self.cap and self.cap.isOpened():
             success, frame = self.cap.read()
@@ -59,29 +111,42 @@ class CameraSession:
                 break
 
             frame_idx += 1
-            if frame_idx % skip == 0:
-                results = recognize_faces_in_frame(frame, known_encodings, self.tolerance)
+            if detector:
+                self.motion_active = detector.update(frame)
+                if not self.motion_active:
+                    self.idle_frames += 1
+            if (self.motion_active or not detector) and frame_idx % skip == 0:
+                results = recognize_faces_in_frame(frame, known_encodings, self.tolerance, quality)
                 self.last_results = results
+                for result in results:
+                    reason = result.get('rejected')
+                    if reason:
+                        self.quality_rejects[reason] = self.quality_rejects.get(reason, 0) + 1
 
                 # Auto-mark attendance for recognized faces
                 with self.app.app_context():
                     for result in results:
                         key = result['student_db_key']
-                        if key and key not in self.marked_today and result['confidence'] > 0.6:
+                        if key and key not in self.marked_today and result['confidence'] > min_confidence:
                             self._mark_attendance(key, result['confidence'])
 
                 frame = draw_recognition_results(frame, results, student_names)
 
-            # Encode and yield
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            if ret:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' +
-                       buffer.tobytes() + b'\r\n')
+            yield frame
 
     def _mark_attendance(self, student_db_key, confidence):
         """Mark attendance in the database."""
+        from app.marking import marked_cache
         try:
+            # Already marked today (by any session or write path): no queries, bar a periodic re-check
+            cache = marked_cache()
+            known, dept_id = True, self.department_id
+            if not dept_id:
+                known, dept_id = cache.home_department(student_db_key)
+            if known and cache.contains(student_db_key, dept_id):
+                self.marked_today.add(student_db_key)
+                return
+
             student = Student.query.filter_by(student_id=student_db_key).first()
             if not student:
                 return
@@ -101,7 +166,7 @@ class CameraSession:
                 department_id=dept_id
             ).first()
             if existing:
-                self.marked_today.add(student_db_key)
+                self._remember_mark(cache, student_db_key, dept_id)
                 return
             record = Attendance(
                 student_id=student.id,
@@ -114,13 +179,30 @@ class CameraSession:
             )
             db.session.add(record)
             db.session.commit()
-            self.marked_today.add(student_db_key)
+            self._remember_mark(cache, student_db_key, dept_id)
             msg = f"✅ Marked: {student.name} ({datetime.now().strftime('%H:%M:%S')})"
-            self.status_messages.insert(0, msg)
-            self.status_messages = self.status_messages[:20]  # Keep last 20
+            self._push_status(msg, student_db_key)
         except Exception as e:
             db.session.rollback()
 
+    def _remember_mark(self, cache, student_db_key, dept_id):
+        """Note a mark in this session and the day cache (with the home department if resolved here)."""
+        if self.department_id:
+            cache.add(student_db_key, dept_id)
+        else:
+            cache.add(student_db_key, dept_id, home=dept_id)
+        self.marked_today.add(student_db_key)
+
+    def _push_status(self, msg, student_db_key=None):
+        """Record a status message and push it to SSE subscribers."""
+        self.status_messages.insert(0, msg)
+        self.status_messages = self.status_messages[:20]  # Keep last 20
+        camera_events.publish('mark', {
+            'message': msg,
+            'student_id': student_db_key,
+            'marked_count': len(self.marked_today),
+        })
+
 
 # Global session (single camera)
 _session = None
@@ -129,7 +211,9 @@ _session_lock = threading.Lock()
 
 @camera_bp.route('/')
 def camera_page():
-    return render_template('camera.html')
+    from app.streaming import stream_profiles, profile_name
+    return render_template('camera.html', stream_profiles=stream_profiles(current_app.config),
+                           default_profile=profile_name(current_app.config))
 
 
 @camera_bp.route('/start', methods=['POST'])
@@ -139,6 +223,18 @@ def start_camera():
     department_id = data.get('department_id')
     tolerance = float(data.get('tolerance', 0.5))
 
+    if current_app.config.get('CAMERA_WORKER'):
+        ring = _attach_ring()
+        if ring is None:
+            return jsonify({'success': False, 'error': 'Camera worker is not running (start `flask camera-worker`)'})
+        try:
+            if ring.read_status()[1].get('running'):
+                return jsonify({'success': False, 'error': 'Camera already running'})
+            ring.request(running=True, department_id=department_id, tolerance=tolerance)
+        finally:
+            ring.close()
+        return jsonify({'success': True, 'message': 'Camera start requested'})
+
     with _session_lock:
         if _session and _session.running:
             return jsonify({'success': False, 'error': 'Camera already running'})
@@ -149,14 +245,10 @@ def start_camera():
         if not ok:
             _session = None
             return jsonify({'success': False, 'error': err})
+        camera_events.publish('session', _session_state())
 
-    # Start frame generation in background thread
-    def run():
-        for _ in _session.generate_frames():
-            if not _session.running:
-                break
-
-    t = threading.Thread(target=run, daemon=True)
+    # Capture and recognise in a background thread; /feed viewers encode on demand
+    t = threading.Thread(target=_session.run, daemon=True)
     t.start()
     return jsonify({'success': True, 'message': 'Camera started'})
 
@@ -164,45 +256,240 @@ def start_camera():
 @camera_bp.route('/stop', methods=['POST'])
 def stop_camera():
     global _session
+    if current_app.config.get('CAMERA_WORKER'):
+        ring = _attach_ring()
+        if ring is not None:
+            ring.request(running=False)
+            ring.close()
+        return jsonify({'success': True, 'message': 'Camera stop requested'})
+
     with _session_lock:
         if _session:
             _session.stop()
             _session = None
+    camera_events.publish('session', _session_state())
     return jsonify({'success': True, 'message': 'Camera stopped'})
 
 
-@camera_bp.route('/feed')
-def video_feed():
-    global _session
-    if not _session or not _session.running:
-        # Return a blank frame if camera not started
-        blank = np.zeros((480, 640, 3), dtype=np.uint8)
-        cv2.putText(blank, 'Camera not started', (150, 240),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        ret, buffer = cv2.imencode('.jpg', blank)
-        frame = buffer.tobytes()
+def _multipart(jpeg):
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+
 
-        def gen_blank():
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+def _blank_frame():
+    import cv2
+    import numpy as np
+    blank = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.putText(blank, 'Camera not started', (150, 240),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    ret, buffer = cv2.imencode('.jpg', blank)
+    return buffer.tobytes()
 
-        return Response(gen_blank(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
-    def gen():
-        yield from _session.generate_frames()
+def _worker_timeout():
+    return current_app.config.get('CAMERA_WORKER_TIMEOUT', 5)
 
-    return Response(gen(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def _attach_ring():
+    """The camera worker's ring, or None if there is no worker or its heartbeat has stopped."""
+    from app.framebuffer import FrameRing
+    ring = FrameRing.attach(current_app.config.get('CAMERA_SHM_NAME', 'hostel_attendance_camera'))
+    if ring is not None and not ring.alive(_worker_timeout()):
+        ring.close()
+        return None
+    return ring
+
+
+def _ring_frames(ring, profile=0, poll=0.01, timeout=5):
+    """Yield each new frame the worker publishes for `profile` until the session stops or the worker dies."""
+    last = 0
+    try:
+        while True:
+            ring.touch(profile)  # the worker only encodes profiles someone is watching
+            seq, jpeg = ring.latest_frame(profile)
+            if seq and seq != last:
+                last = seq
+                yield _multipart(jpeg)
+            elif not ring.alive(timeout) or not ring.control().get('running'):
+                break
+            else:
+                time.sleep(poll)
+    finally:
+        ring.close()
+
+
+@camera_bp.route('/feed')
+def video_feed():
+    """MJPEG stream; `?profile=` picks a STREAM_PROFILES size/quality."""
+    from app.streaming import stream_profiles, profile_name
+    profile = profile_name(current_app.config, request.args.get('profile'))
+    session = _session
+    if current_app.config.get('CAMERA_WORKER'):
+        ring = _attach_ring()
+        if ring is not None and ring.control().get('running'):
+            index = list(stream_profiles(current_app.config)).index(profile)
+            return Response(_ring_frames(ring, index, timeout=_worker_timeout()),
+                            mimetype='multipart/x-mixed-replace; boundary=frame')
+        if ring is not None:
+            ring.close()
+    elif session and session.running:
+        return Response(session.stream(profile), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+    # Return a blank frame if camera not started
+    frame = _blank_frame()
+
+    def gen_blank():
+        yield _multipart(frame)
+
+    return Response(gen_blank(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+def session_state(session):
+    """Snapshot of a camera session, shared by /status, /events and the camera worker."""
+    if not session or not session.running:
+        return {'running': False, 'marked_count': 0, 'messages': []}
+
+    return {
+        'running': True,
+        'marked_count': len(session.marked_today),
+        'marked_students': list(session.marked_today),
+        'quality_rejects': session.quality_rejects,
+        'motion_active': session.motion_active,
+        'idle_frames': session.idle_frames,
+        'messages': session.status_messages
+    }
+
+
+def _session_state():
+    if current_app.config.get('CAMERA_WORKER'):
+        ring = _attach_ring()
+        if ring is None:
+            return session_state(None)
+        try:
+            return ring.read_status()[1] or session_state(None)
+        finally:
+            ring.close()
+    return session_state(_session)
+
+
+def _ring_events(ring, poll=0.25, heartbeat=15, timeout=5):
+    """
+    SSE stream of the status the camera worker publishes, sent whenever it
+    changes. Ends once the worker's heartbeat lapses: a restarted worker
+    creates a new segment, so the browser has to reconnect to attach to it.
+    """
+    last, idle = None, 0.0
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            if not ring.alive(timeout):
+                yield format_sse('session', session_state(None))
+                return
+            seq, status = ring.read_status()
+            if seq != last:
+                last, idle = seq, 0.0
+                yield format_sse('session', status or session_state(None))
+            elif idle >= heartbeat:
+                idle = 0.0
+                yield ': keep-alive\n\n'
+            time.sleep(poll)
+            idle += poll
+    finally:
+        ring.close()
 
 
 @camera_bp.route('/status')
 def camera_status():
-    global _session
-    if not _session or not _session.running:
-        return jsonify({'running': False, 'marked_count': 0, 'messages': []})
+    return jsonify(_session_state())
+
+
+@camera_bp.route('/events')
+def camera_event_stream():
+    """Server-Sent Events stream of session changes and marks."""
+    if current_app.config.get('CAMERA_WORKER'):
+        # Nothing publishes to camera_events in this mode: with no worker yet, report
+        # stopped and close, and the browser's reconnect tries to attach again
+        ring = _attach_ring()
+        stream = _ring_events(ring, timeout=_worker_timeout()) if ring is not None else \
+            iter(['retry: 3000\n\n', format_sse('session', session_state(None))])
+    else:
+        stream = camera_events.stream(initial=[('session', _session_state())])
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@camera_bp.route('/api/identify', methods=['POST'])
+def identify_faces():
+    """
+    Recognise faces captured by a remote gate, without a local camera.
+    The body is either raw little-endian float32 embeddings (512 bytes
+    each, several concatenated), or multipart with an `embeddings` part
+    in that format and/or one or more `crop` JPEG face crops.
+    Query args: tolerance, mark=1 to write attendance for confident
+    matches, department_id for those marks.
+    """
+    from app.face_utils import load_gallery, parse_embeddings, encode_face_crops, match_encodings
+    from app.marking import record_marks
+    tolerance = request.args.get('tolerance', current_app.config.get('FACE_RECOGNITION_TOLERANCE', 0.5), type=float)
+    mark = request.args.get('mark', 0, type=int)
+    department_id = request.args.get('department_id', type=int)
+
+    if request.files:
+        crops = request.files.getlist('crop')
+        part = request.files.get('embeddings')
+        data = part.read() if part else b''
+    else:
+        crops = []
+        data = request.get_data()
+
+    encodings = []
+    if data:
+        parsed = parse_embeddings(data)
+        if parsed is None:
+            return jsonify({'success': False, 'error': 'Embeddings must be 128 finite float32 values (512 bytes) each'}), 400
+        encodings.extend(parsed)
+    if not encodings and not crops:
+        return jsonify({'success': False, 'error': 'No embeddings or face crops supplied'}), 400
+    limit = current_app.config.get('IDENTIFY_MAX_FACES', 32)
+    if len(encodings) + len(crops) > limit:
+        return jsonify({'success': False, 'error': f'At most {limit} faces per request'}), 413
+    encodings.extend(encode_face_crops(crops))
+
+    keys, matrix = load_gallery(current_app.config['ENCODINGS_FOLDER'])
+    usable = [i for i, enc in enumerate(encodings) if enc is not None]
+    matches = dict(zip(usable, match_encodings([encodings[i] for i in usable], keys, matrix, tolerance)))
+    matched = {m[0] for m in matches.values() if m[0]}
+    names = dict(db.session.query(Student.student_id, Student.name)
+                 .filter(Student.student_id.in_(matched)).tuples()) if matched else {}
+
+    faces = []
+    for index in range(len(encodings)):
+        if index not in matches:
+            faces.append({'index': index, 'student_id': None, 'error': 'No face encoding'})
+            continue
+        key, confidence, distance = matches[index]
+        faces.append({
+            'index': index,
+            'student_id': key,
+            'name': names.get(key, 'Unknown') if key else 'Unknown',
+            'confidence': round(confidence, 4),
+            'distance': round(distance, 4) if distance is not None else None,
+        })
+
+    if mark:
+        min_confidence = current_app.config.get('MARK_MIN_CONFIDENCE', 0.6)
+        confident = [f for f in faces if f['student_id'] and f['confidence'] > min_confidence]
+        try:
+            results = record_marks(
+                [{'student_db_id': f['student_id'], 'confidence': f['confidence'], 'marked_by': 'remote_gate'}
+                 for f in confident],
+                department_id, department_from_student=True
+            )
+        except Exception:
+            current_app.logger.exception('Remote gate mark failed')
+            return jsonify({'success': False, 'error': 'Could not record marks'}), 500
+        for face, result in zip(confident, results):
+            face['mark'] = result['status']
 
-    return jsonify({
-        'running': True,
-        'marked_count': len(_session.marked_today),
-        'marked_students': list(_session.marked_today),
-        'messages': _session.status_messages
-    })
+    return jsonify({'success': True, 'faces': faces})
@@ -1,8 +1,13 @@
 from flask import Blueprint, render_template, request, jsonify, send_file
-from app.models import Attendance, Student, Department
+from app.models import Student, Department
 from app import db
+from app.archive import attendance_records, attendance_models
+from app.absences import student_summary, absent_days
+from app.bitmaps import range_stats
 from datetime import date, datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import select
+from itertools import repeat
+from operator import itemgetter
 import io
 import csv
 
@@ -12,8 +17,7 @@ reports_bp = Blueprint('reports', __name__)
 @reports_bp.route('/')
 def reports_page():
     departments = Department.query.order_by(Department.name).all()
-    students = Student.query.filter_by(is_active=True).order_by(Student.name).all()
-    return render_template('reports.html', departments=departments, students=students)
+    return render_template('reports.html', departments=departments)
 
 
 @reports_bp.route('/api/summary')
@@ -30,14 +34,7 @@ def api_summary():
         start_date = date.today() - timedelta(days=30)
         end_date = date.today()
 
-    query = Attendance.query.filter(
-        Attendance.date >= start_date,
-        Attendance.date <= end_date
-    )
-    if department_id:
-        query = query.filter_by(department_id=department_id)
-
-    records = query.all()
+    records = attendance_records(start_date, end_date, department_id)
     total_records = len(records)
     unique_students = len(set(r.student_id for r in records))
     by_status = {}
@@ -80,36 +77,57 @@ def student_report():
         start_date = date.today() - timedelta(days=30)
         end_date = date.today()
 
-    query = Attendance.query.filter(
-        Attendance.date >= start_date,
-        Attendance.date <= end_date
-    )
-    if department_id:
-        query = query.filter_by(department_id=department_id)
+    # Includes students with no rows at all: unmarked working days count as absent
+    return jsonify(student_summary(start_date, end_date, department_id))
 
-    records = query.all()
-    student_map = {}
-    for r in records:
-        sid = r.student_id
-        if sid not in student_map:
-            student_map[sid] = {
-                'student_id': r.student.student_id if r.student else '',
-                'name': r.student.name if r.student else 'Unknown',
-                'department': r.student.department if r.student else '',
-                'present': 0,
-                'absent': 0,
-                'late': 0,
-                'total': 0
-            }
-        student_map[sid]['total'] += 1
-        status = r.status or 'present'
-        student_map[sid][status] = student_map[sid].get(status, 0) + 1
-
-    rows = sorted(student_map.values(), key=lambda x: x['name'])
-    for row in rows:
-        row['attendance_pct'] = round((row['present'] / row['total']) * 100, 1) if row['total'] > 0 else 0.0
-
-    return jsonify(rows)
+
+@reports_bp.route('/api/attendance_pct')
+def attendance_pct():
+    """Attendance percentage and streaks per student, optionally only those below a threshold."""
+    start_str = request.args.get('start')
+    end_str = request.args.get('end')
+    department_id = request.args.get('department_id', type=int)
+    below = request.args.get('below', type=float)
+
+    try:
+        start_date = datetime.strptime(start_str, '%Y-%m-%d').date() if start_str else (date.today() - timedelta(days=30))
+        end_date = datetime.strptime(end_str, '%Y-%m-%d').date() if end_str else date.today()
+    except ValueError:
+        start_date = date.today() - timedelta(days=30)
+        end_date = date.today()
+
+    return jsonify(range_stats(start_date, end_date, department_id, below))
+
+
+def _export_rows(start_date, end_date, department_id=None):
+    """
+    (date, student pk, csv row) for each attendance row in the range.
+    Plain columns with names looked up in dicts: loading an ORM object
+    and its student and block per row made a semester-long export take
+    tens of seconds.
+    """
+    students = {s.id: (s.student_id, s.name, s.department or '') for s in
+                db.session.query(Student.id, Student.student_id, Student.name, Student.department)}
+    blocks = dict(db.session.query(Department.id, Department.name))
+    days = {}  # date: ISO string, formatted once per day rather than once per row
+    rows = []
+    for model in attendance_models(start_date):
+        query = select(
+            model.date, model.student_id, model.department_id,
+            model.time_in, model.status, model.confidence, model.marked_by,
+        ).where(model.date >= start_date, model.date <= end_date)
+        if department_id:
+            query = query.where(model.department_id == department_id)
+        for day, student, block, time_in, status, confidence, marked_by in db.session.connection().execute(query):
+            roll, name, department = students.get(student, ('', '', ''))
+            if day not in days:
+                days[day] = day.isoformat()
+            day = days[day]
+            rows.append((day, student, [
+                roll, name, department, blocks.get(block, ''), day, time_in.strftime('%H:%M:%S') if time_in else '',
+                status, f"{confidence * 100:.1f}" if confidence else '', marked_by,
+            ]))
+    return rows
 
 
 @reports_bp.route('/api/export_csv')
@@ -118,6 +136,7 @@ def export_csv():
     start_str = request.args.get('start')
     end_str = request.args.get('end')
     department_id = request.args.get('department_id', type=int)
+    include_absent = request.args.get('include_absent', 1, type=int)
 
     try:
         start_date = datetime.strptime(start_str, '%Y-%m-%d').date() if start_str else (date.today() - timedelta(days=30))
@@ -126,31 +145,24 @@ def export_csv():
         start_date = date.today() - timedelta(days=30)
         end_date = date.today()
 
-    query = Attendance.query.filter(
-        Attendance.date >= start_date,
-        Attendance.date <= end_date
-    ).order_by(Attendance.date, Attendance.student_id)
-
-    if department_id:
-        query = query.filter_by(department_id=department_id)
-
-    records = query.all()
+    rows = _export_rows(start_date, end_date, department_id)
+    if include_absent:
+        # Working days on which a rostered student has no row at all
+        department = db.session.get(Department, department_id) if department_id else None
+        block = department.name if department else ''
+        absent = absent_days(start_date, end_date, department_id)
+        names = {day: day.isoformat() for day in absent['date'].unique()}
+        days = [names[day] for day in absent['date']]
+        rows.extend(zip(days, absent['id'].tolist(), zip(
+            absent['student_id'], absent['name'], absent['department'].fillna(''), repeat(block), days,
+            repeat(''), repeat('absent'), repeat(''), repeat('auto'),
+        )))
+    rows.sort(key=itemgetter(0, 1))
 
     output = io.StringIO()
     writer = csv.writer(output)
     writer.writerow(['Student ID', 'Name', 'Department', 'Hostel Block', 'Date', 'Time In', 'Status', 'Confidence (%)', 'Marked By'])
-    for r in records:
-        writer.writerow([
-            r.student.student_id if r.student else '',
-            r.student.name if r.student else '',
-            r.student.department if r.student else '',
-            r.department.name if r.department else '',
-            r.date.isoformat() if r.date else '',
-            r.time_in.strftime('%H:%M:%S') if r.time_in else '',
-            r.status,
-            f"{r.confidence * 100:.1f}" if r.confidence else '',
-            r.marked_by
-        ])
+    writer.writerows(row for _, _, row in rows)
 
     output.seek(0)
     return send_file(
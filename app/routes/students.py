@@ -1,18 +1,68 @@
-from flask import Blueprint, render_template, request, jsonify, current_app, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, current_app, flash, redirect, url_for, send_file, abort
 from werkzeug.utils import secure_filename
 from app.models import Student, Department
 from app import db
-from app.face_utils import encode_face_from_image, save_encoding, allowed_file
+from app.face_utils import (encode_face_from_image, save_encoding, allowed_file, encoding_cache,
+                            load_gallery, find_duplicate_face)
+from app.thumbnails import make_thumbnails, remove_thumbnails, thumbnail_name, thumbnail_path
+from app.marking import marked_cache
 import os
 import uuid
 
 students_bp = Blueprint('students', __name__)
 
 
+def _duplicate_face_error(encoding, student_id):
+    """Return an error message if this face is already enrolled under another student."""
+    keys, matrix = load_gallery(current_app.config['ENCODINGS_FOLDER'])
+    match, distance = find_duplicate_face(
+        encoding, keys, matrix, current_app.config.get('DUPLICATE_FACE_TOLERANCE', 0.5), exclude=student_id
+    )
+    if not match:
+        return None
+    other = Student.query.filter_by(student_id=match).first()
+    label = f"{other.name} ({match})" if other else match
+    return f"This face is already enrolled as {label} (distance {distance:.2f})"
+
+
+def _make_thumbnails(photo_save_path):
+    """Best effort: missing thumbnails are generated on first request anyway."""
+    make_thumbnails(
+        photo_save_path,
+        current_app.config['THUMBNAIL_FOLDER'],
+        size=current_app.config.get('THUMBNAIL_SIZE', 320),
+        quality=current_app.config.get('THUMBNAIL_QUALITY', 80),
+    )
+
+
+def _photo_file(photo_path):
+    """Where a stored photo_path ('student_photos/<file>') lives in UPLOAD_FOLDER."""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], os.path.basename(photo_path))
+
+
+def _remove_photo(photo_path):
+    """Delete a photo and its thumbnails."""
+    if not photo_path:
+        return
+    full_path = _photo_file(photo_path)
+    if os.path.exists(full_path):
+        os.remove(full_path)
+    remove_thumbnails(photo_path, current_app.config['THUMBNAIL_FOLDER'])
+
+
+def _accepts_webp():
+    """True only when the Accept header names image/webp; */* and image/* do not count."""
+    return any(mimetype.lower() == 'image/webp' and quality > 0
+               for mimetype, quality in request.accept_mimetypes)
+
+
 @students_bp.route('/')
 def list_students():
-    students = Student.query.order_by(Student.created_at.desc()).all()
-    return render_template('students.html', students=students)
+    # Cards are loaded page by page from /students/api/search
+    departments = [d for (d,) in db.session.query(Student.department)
+                   .filter(Student.department.isnot(None)).distinct().order_by(Student.department)]
+    total = Student.query.count()
+    return render_template('students.html', departments=departments, total=total)
 
 
 @students_bp.route('/add', methods=['GET', 'POST'])
@@ -45,16 +95,25 @@ def add_student():
             photo_path = f"student_photos/{filename}"
 
             # Generate face encoding
-            encoding, err = encode_face_from_image(photo_save_path)
+            encoding, err = encode_face_from_image(photo_save_path, encoding_cache(current_app.config))
             if err:
+                _remove_photo(photo_path)
                 return jsonify({'success': False, 'error': f'Face encoding error: {err}'}), 400
 
+            dup_err = _duplicate_face_error(encoding, student_id)
+            if dup_err:
+                _remove_photo(photo_path)
+                return jsonify({'success': False, 'error': dup_err}), 400
+
             enc_path, enc_err = save_encoding(
                 encoding, student_id, current_app.config['ENCODINGS_FOLDER']
             )
             if enc_err:
+                _remove_photo(photo_path)
                 return jsonify({'success': False, 'error': f'Could not save face data: {enc_err}'}), 500
             encoding_path = enc_path
+            # Only accepted photos get thumbnails
+            _make_thumbnails(photo_save_path)
 
         student = Student(
             student_id=student_id,
@@ -86,27 +145,41 @@ def edit_student(student_id):
     if request.method == 'POST':
         student.name = request.form.get('name', student.name).strip()
         student.email = request.form.get('email', '').strip() or None
+        old_department = student.department
         student.department = request.form.get('department', '').strip() or None
         student.year = request.form.get('year', type=int)
 
         photo = request.files.get('photo')
+        old_photo_path = None
         if photo and photo.filename and allowed_file(photo.filename):
             filename = secure_filename(f"{student.student_id}_{uuid.uuid4().hex[:8]}{os.path.splitext(photo.filename)[1]}")
             photo_save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
             photo.save(photo_save_path)
-            student.photo_path = f"student_photos/{filename}"
+            photo_path = f"student_photos/{filename}"
 
-            encoding, err = encode_face_from_image(photo_save_path)
+            encoding, err = encode_face_from_image(photo_save_path, encoding_cache(current_app.config))
             if err:
+                _remove_photo(photo_path)
                 return jsonify({'success': False, 'error': f'Face encoding error: {err}'}), 400
 
+            dup_err = _duplicate_face_error(encoding, student.student_id)
+            if dup_err:
+                _remove_photo(photo_path)
+                return jsonify({'success': False, 'error': dup_err}), 400
+
             enc_path, enc_err = save_encoding(
                 encoding, student.student_id, current_app.config['ENCODINGS_FOLDER']
             )
             if not enc_err:
                 student.encoding_path = enc_path
+            old_photo_path, student.photo_path = student.photo_path, photo_path
+            _make_thumbnails(photo_save_path)
 
         db.session.commit()
+        if student.department != old_department:
+            marked_cache().forget(student.student_id)  # its home department is cached for the camera
+        if old_photo_path and old_photo_path != student.photo_path:
+            _remove_photo(old_photo_path)  # replaced: drop the old photo and its thumbnails
         return jsonify({'success': True, 'student': student.to_dict(), 'message': 'Student updated successfully!'})
 
     departments = Department.query.order_by(Department.name).all()
@@ -117,19 +190,91 @@ def edit_student(student_id):
 def delete_student(student_id):
     student = Student.query.get_or_404(student_id)
     # Remove photo and encoding files
-    if student.photo_path:
-        full_path = os.path.join(current_app.static_folder, student.photo_path)
-        if os.path.exists(full_path):
-            os.remove(full_path)
+    _remove_photo(student.photo_path)
     if student.encoding_path and os.path.exists(student.encoding_path):
         os.remove(student.encoding_path)
 
+    roll = student.student_id
     db.session.delete(student)
     db.session.commit()
+    marked_cache().forget(roll)
     return jsonify({'success': True, 'message': 'Student deleted successfully'})
 
 
+@students_bp.route('/api/search')
+def api_search():
+    """
+    Paginated student directory.
+    q: prefix of name or roll number; department, year, active: filters;
+    sort: 'name' (default) or 'recent'.
+    """
+    q = request.args.get('q', '').strip()
+    department = request.args.get('department', '').strip()
+    year = request.args.get('year', type=int)
+    active = request.args.get('active', type=int)
+    sort = request.args.get('sort', 'name')
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 24, type=int), 200)
+
+    query = Student.query
+    if q:
+        # Prefix LIKE so the NOCASE indexes on name/student_id are used
+        pattern = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        query = query.filter(db.or_(
+            Student.name.like(pattern, escape='\\'),
+            Student.student_id.like(pattern, escape='\\'),
+        ))
+    if department:
+        query = query.filter(Student.department == department)
+    if year:
+        query = query.filter(Student.year == year)
+    if active is not None:
+        query = query.filter(Student.is_active == bool(active))
+
+    if sort == 'recent':
+        query = query.order_by(Student.created_at.desc())
+    else:
+        query = query.order_by(Student.name.collate('NOCASE'))
+    paginated = query.paginate(page=page, per_page=per_page, error_out=False)
+
+    return jsonify({
+        'students': [s.to_dict() for s in paginated.items],
+        'total': paginated.total,
+        'page': page,
+        'pages': paginated.pages
+    })
+
+
 @students_bp.route('/api/list')
 def api_list():
     students = Student.query.filter_by(is_active=True).order_by(Student.name).all()
     return jsonify([s.to_dict() for s in students])
+
+
+@students_bp.route('/thumbs/<name>')
+def photo_thumbnail(name):
+    """Serve a student photo thumbnail, as WebP when the browser accepts it."""
+    name = secure_filename(name)
+    folder = current_app.config['THUMBNAIL_FOLDER']
+    ext = 'webp' if _accepts_webp() else 'jpg'
+    path = thumbnail_path(name, folder, ext)
+
+    if not os.path.exists(path):
+        # Photo uploaded before thumbnails existed: generate it now. Names are
+        # '<roll>_<suffix>', so the owner is found by roll number, not a folder scan.
+        student = Student.query.filter_by(student_id=name.rsplit('_', 1)[0]).first() if name else None
+        if not student or not student.photo_path or thumbnail_name(student.photo_path) != name:
+            abort(404)
+        source = _photo_file(student.photo_path)
+        if not os.path.exists(source):
+            abort(404)
+        _make_thumbnails(source)
+        if not os.path.exists(path):
+            abort(404)
+
+    # Names embed the upload's random suffix, so a thumbnail never changes
+    response = send_file(path, mimetype=f'image/{"webp" if ext == "webp" else "jpeg"}',
+                         max_age=current_app.config.get('THUMBNAIL_MAX_AGE', 31536000))
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,102 @@
+"""
+JPEG encoding for the live MJPEG stream.
+
+Frames are encoded only for profiles someone is watching, once per frame
+per profile however many viewers share it. A profile is a (max width,
+JPEG quality) pair, so a phone on a slow link can ask for `?profile=low`
+while the front desk gets full size. When simplejpeg or PyTurboJPEG is
+installed, libjpeg-turbo is called directly with fast DCT and 4:2:0
+subsampling; otherwise cv2.imencode is used.
+"""
+import threading
+
+DEFAULT_PROFILES = {'high': (640, 80), 'medium': (480, 70), 'low': (320, 50)}
+
+
+def stream_profiles(config):
+    """{name: (max_width, quality)} from app config."""
+    return dict(config.get('STREAM_PROFILES') or DEFAULT_PROFILES)
+
+
+def profile_name(config, requested=None):
+    """The requested profile if it exists, else STREAM_DEFAULT_PROFILE."""
+    profiles = stream_profiles(config)
+    if requested in profiles:
+        return requested
+    default = config.get('STREAM_DEFAULT_PROFILE', 'high')
+    return default if default in profiles else next(iter(profiles))
+
+
+class JpegEncoder:
+    """
+    Encode BGR frames to JPEG with the fastest available backend.
+    `backend` is 'auto' (libjpeg-turbo if installed, else OpenCV),
+    'turbo' (same, but warns when it is missing) or 'opencv'.
+    """
+
+    def __init__(self, backend='auto'):
+        self.backend = 'opencv'
+        self._encode = self._encode_opencv
+        if backend in ('auto', 'turbo'):
+            self._load_turbo()
+            if backend == 'turbo' and self.backend == 'opencv':
+                import warnings
+                warnings.warn('libjpeg-turbo bindings (simplejpeg or PyTurboJPEG) not found; using OpenCV')
+
+    def _load_turbo(self):
+        try:
+            import simplejpeg
+        except ImportError:
+            simplejpeg = None
+        if simplejpeg is not None:
+            def encode(frame, quality):
+                return simplejpeg.encode_jpeg(frame, quality=quality, colorspace='BGR',
+                                              colorsubsampling='420', fastdct=True)
+            self._encode, self.backend = encode, 'simplejpeg'
+            return
+
+        try:
+            from turbojpeg import TurboJPEG, TJSAMP_420, TJFLAG_FASTDCT
+            turbo = TurboJPEG()
+        except (ImportError, OSError, RuntimeError):
+            return  # the Python package or the libturbojpeg shared library is missing
+
+        def encode(frame, quality):
+            return turbo.encode(frame, quality=quality, jpeg_subsample=TJSAMP_420, flags=TJFLAG_FASTDCT)
+        self._encode, self.backend = encode, 'turbojpeg'
+
+    @staticmethod
+    def _encode_opencv(frame, quality):
+        import cv2
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes() if ok else None
+
+    def encode(self, frame, quality=80):
+        """JPEG bytes for a BGR uint8 frame, or None if encoding failed."""
+        import numpy as np
+        return self._encode(np.ascontiguousarray(frame), int(quality))
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def jpeg_encoder(config):
+    """The process-wide encoder for the JPEG_ENCODER setting."""
+    backend = config.get('JPEG_ENCODER', 'auto')
+    with _encoders_lock:
+        if backend not in _encoders:
+            _encoders[backend] = JpegEncoder(backend)
+        return _encoders[backend]
+
+
+def encode_frame(frame, profile, encoder):
+    """Downscale `frame` to the profile's width (never up) and encode it."""
+    import cv2
+    width, quality = profile
+    height, frame_width = frame.shape[:2]
+    if width and frame_width > width:
+        # INTER_AREA has a fast path for whole-number ratios only; elsewhere it is several times slower
+        interpolation = cv2.INTER_AREA if frame_width % width == 0 else cv2.INTER_LINEAR
+        frame = cv2.resize(frame, (width, round(height * width / frame_width)), interpolation=interpolation)
+    return encoder.encode(frame, quality)
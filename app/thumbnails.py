@@ -0,0 +1,43 @@
+import os
+
+THUMBNAIL_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+
+def thumbnail_name(photo_path):
+    """Thumbnail name for a stored photo (its file stem), or None."""
+    if not photo_path:
+        return None
+    return os.path.splitext(os.path.basename(photo_path))[0]
+
+
+def thumbnail_path(name, thumbs_folder, ext):
+    return os.path.join(thumbs_folder, f"{name}.{ext}")
+
+
+def make_thumbnails(image_path, thumbs_folder, size=320, quality=80):
+    """
+    Write WebP and JPEG thumbnails of an uploaded photo.
+    Returns the thumbnail name, or None and an error message.
+    """
+    from PIL import Image, ImageOps
+    name = thumbnail_name(image_path)
+    try:
+        os.makedirs(thumbs_folder, exist_ok=True)
+        with Image.open(image_path) as img:
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            img.thumbnail((size, size), Image.LANCZOS)
+            for ext, fmt in THUMBNAIL_FORMATS.items():
+                img.save(thumbnail_path(name, thumbs_folder, ext), fmt, quality=quality)
+        return name, None
+    except Exception as e:
+        return None, str(e)
+
+
+def remove_thumbnails(photo_path, thumbs_folder):
+    name = thumbnail_name(photo_path)
+    if not name:
+        return
+    for ext in THUMBNAIL_FORMATS:
+        path = thumbnail_path(name, thumbs_folder, ext)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,112 @@
+"""
+Compare JPEG encoders and stream profiles for the live MJPEG feed.
+
+Usage:
+    python benchmarks/bench_jpeg.py                    # synthetic 640x480 frames
+    python benchmarks/bench_jpeg.py recording.mp4
+    python benchmarks/bench_jpeg.py path/to/frames/ --limit 200
+
+The baseline is what the camera loop used to do for every captured frame:
+cv2.imencode at quality 80 and full size. Each available backend (OpenCV,
+and libjpeg-turbo through simplejpeg or PyTurboJPEG when installed) is then
+timed for every STREAM_PROFILES entry, reporting CPU per frame, frames
+per second and average frame size.
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.streaming import JpegEncoder, encode_frame  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def load_frames(source, limit):
+    frames = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                frame = cv2.imread(os.path.join(source, name))
+                if frame is not None:
+                    frames.append(frame)
+            if len(frames) >= limit:
+                break
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < limit:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+def synthetic_frames(count, width=640, height=480):
+    """Smooth gradients with sensor-like noise, which compress roughly like a corridor camera."""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frames = []
+    for i in range(count):
+        base = np.stack([(x + i) % 256 + 0 * y, (y + 2 * i) % 256 + 0 * x, (x + y) / 2], axis=2)
+        noise = rng.normal(0, 6, base.shape)
+        frames.append(np.clip(base + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def run(frames, encode, repeat):
+    sizes = 0
+    start = time.process_time()
+    for _ in range(repeat):
+        for frame in frames:
+            sizes += len(encode(frame))
+    cpu = time.process_time() - start
+    count = len(frames) * repeat
+    return cpu / count * 1000, count / cpu if cpu else float('inf'), sizes / count / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('source', nargs='?', help='video file or directory of frames (default: synthetic)')
+    parser.add_argument('--limit', type=int, default=100, help='max frames to load')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the frames per measurement')
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.limit) if args.source else synthetic_frames(args.limit)
+    if not frames:
+        sys.exit(f'No frames read from {args.source}')
+    height, width = frames[0].shape[:2]
+    print(f'{len(frames)} frames of {width}x{height}, {args.repeat} passes\n')
+    print(f'{"encoder":<12}{"profile":<10}{"size":>10}{"ms CPU":>9}{"fps":>9}{"KiB":>8}{"speedup":>9}')
+
+    def baseline_encode(frame):
+        return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1]
+
+    base_ms, base_fps, base_kib = run(frames, baseline_encode, args.repeat)
+    print(f'{"imencode":<12}{"baseline":<10}{f"{width}px q80":>10}{base_ms:>9.2f}{base_fps:>9.0f}'
+          f'{base_kib:>8.1f}{1.0:>8.2f}x')
+
+    encoders = [JpegEncoder('opencv')]
+    turbo = JpegEncoder('auto')
+    if turbo.backend != 'opencv':
+        encoders.append(turbo)
+    else:
+        print('(libjpeg-turbo bindings not installed: pip install simplejpeg or PyTurboJPEG to compare)')
+
+    for encoder in encoders:
+        for name, profile in Config.STREAM_PROFILES.items():
+            ms, fps, kib = run(frames, lambda f: encode_frame(f, profile, encoder), args.repeat)
+            print(f'{encoder.backend:<12}{name:<10}{f"{profile[0]}px q{profile[1]}":>10}{ms:>9.2f}{fps:>9.0f}'
+                  f'{kib:>8.1f}{base_ms / ms:>8.2f}x')
+
+    print('\nWith no viewers connected, nothing is encoded: the camera loop only keeps the latest frame.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Measure the CPU saved by the face quality gate on recorded frames.
+
+Usage:
+    python benchmarks/bench_quality_gate.py recording.mp4
+    python benchmarks/bench_quality_gate.py path/to/frames/
+
+Runs recognize_faces_in_frame over the same frames with and without the
+gate and reports CPU time per frame and how many faces were skipped.
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.face_utils import recognize_faces_in_frame  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def load_frames(source, limit):
+    frames = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                frame = cv2.imread(os.path.join(source, name))
+                if frame is not None:
+                    frames.append(frame)
+            if len(frames) >= limit:
+                break
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < limit:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+def run(frames, quality):
+    rejects = {}
+    faces = 0
+    start = time.process_time()
+    for frame in frames:
+        for result in recognize_faces_in_frame(frame, {}, Config.FACE_RECOGNITION_TOLERANCE, quality):
+            faces += 1
+            reason = result.get('rejected')
+            if reason:
+                rejects[reason] = rejects.get(reason, 0) + 1
+    return time.process_time() - start, faces, rejects
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('source', help='video file or directory of frames')
+    parser.add_argument('--limit', type=int, default=300, help='max frames to process')
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.limit)
+    if not frames:
+        sys.exit(f'No frames read from {args.source}')
+
+    quality = {
+        'min_size': Config.FACE_MIN_SIZE,
+        'blur_threshold': Config.FACE_BLUR_THRESHOLD,
+        'max_yaw': Config.FACE_MAX_YAW,
+    }
+    base_cpu, faces, _ = run(frames, None)
+    gate_cpu, _, rejects = run(frames, quality)
+
+    skipped = sum(rejects.values())
+    print(f'frames:            {len(frames)}')
+    print(f'faces detected:    {faces}')
+    print(f'encodings skipped: {skipped} {rejects}')
+    print(f'no gate:           {base_cpu / len(frames) * 1000:.1f} ms CPU/frame')
+    print(f'with gate:         {gate_cpu / len(frames) * 1000:.1f} ms CPU/frame')
+    if base_cpu > 0:
+        print(f'CPU saved:         {(1 - gate_cpu / base_cpu) * 100:.1f}%')
+
+
+if __name__ == '__main__':
+    main()
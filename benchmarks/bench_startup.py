@@ -0,0 +1,61 @@
+"""
+Measure application startup time for the web and CLI entry points.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10]
+
+Each run is a fresh interpreter so import costs are included. The web
+case imports run.py (which calls create_app); the CLI case runs
+`flask --app run routes`. A scratch SQLite database is used so the
+first (migrating) boot is reported separately from warm boots.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+WEB = [sys.executable, '-c',
+       'import sys, run; '
+       'print(",".join(m for m in ("cv2", "numpy", "face_recognition") if m in sys.modules))']
+CLI = [sys.executable, '-m', 'flask', '--app', 'run', 'routes']
+
+
+def time_command(cmd, env):
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.exit(f'{" ".join(cmd)} failed:\n{proc.stderr}')
+    return elapsed, proc.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(tmp, "bench.db")}')
+
+        first, _ = time_command(WEB, env)
+        print(f'first boot (creates schema): {first * 1000:.0f} ms')
+
+        for label, cmd in (('web', WEB), ('cli', CLI)):
+            times = []
+            out = ''
+            for _ in range(args.runs):
+                elapsed, out = time_command(cmd, env)
+                times.append(elapsed)
+            print(f'{label}: median {statistics.median(times) * 1000:.0f} ms, '
+                  f'min {min(times) * 1000:.0f} ms over {args.runs} runs')
+            if label == 'web':
+                print(f'     vision modules loaded at startup: {out.strip() or "none"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+HTTP load test for the attendance and reports APIs, driven by scenario files.
+
+Usage:
+    python benchmarks/loadtest.py benchmarks/scenarios/morning_rush.json
+    python benchmarks/loadtest.py benchmarks/scenarios/mixed_day.json --students 2000 --days 60
+    python benchmarks/loadtest.py scenario.json --url http://127.0.0.1:8000   # an already running app
+
+Without --url a scratch SQLite database is seeded (students, hostel blocks,
+attendance history) and the app is started locally with `flask run`.
+Each scenario phase runs `users` concurrent clients that pick requests by
+weight and pause for `think_time` seconds between them. Throughput,
+p50/p95/p99 latency and error rate are reported per phase and endpoint.
+
+Scenario format (JSON):
+    {"name": ..., "phases": [{"name": ..., "duration": 30, "users": 20,
+      "think_time": [0.0, 0.2], "requests": [{"name": "mark", "weight": 8,
+      "method": "POST", "path": "/attendance/api/mark",
+      "json": {"student_db_id": "{student}", "department_id": "{department}"}}]}]}
+Placeholders: {student} (random roll number), {department} (random block
+id), {today}, {month_ago}, {page} (1-5).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def seed_database(db_path, students, departments, days):
+    """Fill a scratch database with a roster and `days` of attendance history."""
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    sys.path.insert(0, ROOT)
+    import sqlalchemy as sa
+    from app import create_app, db
+    from app.models import Student, Department, Attendance
+    from app.bitmaps import rebuild_bitmaps
+
+    app = create_app()
+    rng = random.Random(0)
+    with app.app_context():
+        db.session.execute(sa.insert(Department), [
+            {'code': f'B{d + 1}', 'name': f'Block {d + 1}'} for d in range(departments)
+        ])
+        db.session.execute(sa.insert(Student), [
+            {'student_id': f'R{i:05d}', 'name': f'Student {i:05d}', 'department': f'Block {i % departments + 1}',
+             'year': i % 4 + 1, 'is_active': True, 'created_at': datetime(2000, 1, 1)}
+            for i in range(students)
+        ])
+        rows = []
+        for k in range(1, days + 1):
+            day = date.today() - timedelta(days=k)
+            for i in range(students):
+                if rng.random() < 0.85:
+                    rows.append({'student_id': i + 1, 'department_id': i % departments + 1, 'date': day,
+                                 'time_in': datetime(2000, 1, 1, 7, rng.randrange(60)).time(),
+                                 'status': 'present' if rng.random() < 0.9 else 'late',
+                                 'confidence': 0.8, 'marked_by': 'face_recognition'})
+        db.session.execute(sa.insert(Attendance), rows)
+        db.session.commit()
+        rebuild_bitmaps()  # bulk inserts bypass the ORM hooks
+    return len(rows)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_app(db_path, port):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'run', 'run', '--port', str(port), '--no-reload', '--with-threads'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url + '/camera/status', timeout=1).read()
+            return proc, url
+        except (urllib.error.URLError, http.client.HTTPException, ConnectionError):
+            time.sleep(0.2)
+    proc.terminate()
+    sys.exit('app did not start')
+
+
+def fill(value, context):
+    """Substitute placeholders in a request template (strings, lists, dicts)."""
+    if isinstance(value, str):
+        if value.startswith('{') and value.endswith('}') and value[1:-1] in context:
+            return context[value[1:-1]]  # keep the placeholder's type, e.g. an int department id
+        return value.format(**context)
+    if isinstance(value, list):
+        return [fill(v, context) for v in value]
+    if isinstance(value, dict):
+        return {k: fill(v, context) for k, v in value.items()}
+    return value
+
+
+class Client(threading.Thread):
+    def __init__(self, url, phase, roster, departments, deadline, results, seed):
+        super().__init__(daemon=True)
+        self.url, self.phase, self.roster, self.departments = url, phase, roster, departments
+        self.deadline, self.results = deadline, results
+        self.rng = random.Random(seed)
+        self.weights = [r.get('weight', 1) for r in phase['requests']]
+
+    def run(self):
+        think = self.phase.get('think_time', [0.0, 0.0])
+        timeout = self.phase.get('timeout', 10)
+        while time.monotonic() < self.deadline:
+            spec = self.rng.choices(self.phase['requests'], self.weights)[0]
+            context = {
+                'student': self.rng.choice(self.roster),
+                'department': self.rng.randint(1, self.departments),
+                'today': date.today().isoformat(),
+                'month_ago': (date.today() - timedelta(days=30)).isoformat(),
+                'page': self.rng.randint(1, 5),
+            }
+            body = json.dumps(fill(spec['json'], context)).encode() if 'json' in spec else None
+            req = urllib.request.Request(
+                self.url + fill(spec['path'], context), data=body, method=spec.get('method', 'GET'),
+                headers={'Content-Type': 'application/json'} if body else {},
+            )
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=timeout) as resp:
+                    resp.read()
+                    ok = resp.status < 400
+            except (urllib.error.URLError, http.client.HTTPException, ConnectionError, TimeoutError, socket.timeout):
+                # HTTPException covers truncated or malformed responses (IncompleteRead, BadStatusLine),
+                # which would otherwise end this client thread without a trace
+                ok = False
+            self.results.append((spec['name'], time.perf_counter() - start, ok))
+            time.sleep(self.rng.uniform(*think))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def report(phase_name, duration, results):
+    print(f'\n{phase_name} ({duration:.0f}s)')
+    print(f'  {"endpoint":<18}{"requests":>9}{"req/s":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"errors":>9}')
+    summary = {}
+    for name in sorted({r[0] for r in results}) + ['ALL']:
+        rows = [r for r in results if name == 'ALL' or r[0] == name]
+        latencies = [r[1] * 1000 for r in rows]
+        errors = sum(1 for r in rows if not r[2])
+        stats = {
+            'requests': len(rows), 'rps': len(rows) / duration,
+            'p50_ms': statistics.median(latencies), 'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99), 'error_rate': errors / len(rows),
+        }
+        summary[name] = stats
+        print(f'  {name:<18}{stats["requests"]:>9}{stats["rps"]:>8.1f}{stats["p50_ms"]:>9.1f}'
+              f'{stats["p95_ms"]:>9.1f}{stats["p99_ms"]:>9.1f}{stats["error_rate"]:>8.1%}')
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenario')
+    parser.add_argument('--url', help='Test an already running app instead of starting one.')
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--departments', type=int, default=4)
+    parser.add_argument('--days', type=int, default=30, help='Days of attendance history to seed.')
+    parser.add_argument('--json', help='Also write the results to this file.')
+    args = parser.parse_args()
+
+    with open(args.scenario) as f:
+        scenario = json.load(f)
+    roster = [f'R{i:05d}' for i in range(args.students)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = None
+        url = args.url
+        if not url:
+            rows = seed_database(os.path.join(tmp, 'load.db'), args.students, args.departments, args.days)
+            print(f'Seeded {args.students} students, {rows} attendance rows.')
+            proc, url = start_app(os.path.join(tmp, 'load.db'), free_port())
+        print(f'Scenario {scenario.get("name", args.scenario)} against {url}')
+
+        summaries = {}
+        try:
+            for phase in scenario['phases']:
+                results = []
+                deadline = time.monotonic() + phase['duration']
+                clients = [Client(url, phase, roster, args.departments, deadline, results, seed=i)
+                           for i in range(phase['users'])]
+                start = time.monotonic()
+                for client in clients:
+                    client.start()
+                for client in clients:
+                    client.join()
+                if results:
+                    summaries[phase['name']] = report(phase['name'], time.monotonic() - start, results)
+        finally:
+            if proc:
+                proc.terminate()
+                proc.wait()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'scenario': scenario.get('name'), 'phases': summaries}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,8 +12,54 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'student_photos')
     ENCODINGS_FOLDER = os.path.join(BASE_DIR, 'data', 'encodings')
+    # Enrollment encodings cached by photo content hash
+    ENCODING_CACHE_FOLDER = os.path.join(BASE_DIR, 'data', 'encoding_cache')
+    ENCODING_CACHE_MAX_ENTRIES = 5000
+    ENCODING_MODEL_VERSION = 'dlib-resnet-v1'  # Change to invalidate the cache after a model change
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
+    # Listing thumbnails generated from uploaded photos
+    THUMBNAIL_FOLDER = os.path.join(BASE_DIR, 'static', 'student_photos', 'thumbs')
+    THUMBNAIL_SIZE = 320  # Longest side in pixels
+    THUMBNAIL_QUALITY = 80
+    THUMBNAIL_MAX_AGE = 365 * 24 * 3600  # Thumbnails are immutable, cache for a year
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+    # Diagnostics: per-request cProfile (X-Profile: 1 or ?_profile=1) and SQL timing
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+    PROFILE_FOLDER = os.path.join(BASE_DIR, 'data', 'profiles')
+    SLOW_QUERY_MS = 200  # Log statements slower than this, with parameters
+    QUERY_COUNT_WARN = 50  # Log requests that run this many queries (likely N+1)
     # Face recognition settings
     FACE_RECOGNITION_TOLERANCE = 0.5
+    DUPLICATE_FACE_TOLERANCE = 0.5  # Reject enrollments this close to another student's face
     FRAME_SKIP = 3  # Process every Nth frame for performance
+    # Run the camera in `flask camera-worker` and serve it to any number of web workers
+    CAMERA_WORKER = os.environ.get('CAMERA_WORKER', '0') == '1'
+    CAMERA_SHM_NAME = 'hostel_attendance_camera'
+    CAMERA_WORKER_TIMEOUT = 5  # Seconds without a worker heartbeat before the camera counts as stopped
+    CAMERA_RING_SLOTS = 8  # Frames kept in the shared ring buffer
+    CAMERA_RING_SLOT_BYTES = 512 * 1024  # Largest JPEG frame that fits in a slot
+    # Live stream: frames are only encoded for profiles someone is watching (/camera/feed?profile=)
+    STREAM_PROFILES = {'high': (640, 80), 'medium': (480, 70), 'low': (320, 50)}  # name: (max width, JPEG quality)
+    STREAM_DEFAULT_PROFILE = 'high'
+    JPEG_ENCODER = os.environ.get('JPEG_ENCODER', 'auto')  # auto (libjpeg-turbo if installed), turbo, opencv
+    MARK_MIN_CONFIDENCE = 0.6  # Recognised faces below this confidence are shown but not marked
+    IDENTIFY_MAX_FACES = 32  # Most embeddings/crops per /camera/api/identify request
+    ATTENDANCE_BATCH_MAX = 1000  # Most marks accepted by one /attendance/api/mark_batch call
+    MARKED_CACHE_RECHECK = 60  # Seconds a cached 'already marked today' is trusted before one DB re-check
+    # Days on which a student with no attendance row counts as absent
+    WORKING_WEEKDAYS = (0, 1, 2, 3, 4, 5, 6)  # Monday = 0; hostels take roll call daily
+    ATTENDANCE_HOLIDAYS = []  # 'YYYY-MM-DD' dates excluded from absence counts
+    # Months that ended more than this many days ago can be archived
+    ATTENDANCE_HOT_DAYS = 60
+    # Face quality gate (runs before the expensive encoding step)
+    FACE_QUALITY_GATE = True
+    FACE_MIN_SIZE = 60  # Smallest face side in frame pixels
+    FACE_BLUR_THRESHOLD = 40.0  # Minimum Laplacian variance
+    FACE_MAX_YAW = 0.35  # Max nose offset from eye midpoint, as a fraction of eye distance
+    # Motion gate: only run face detection when something moves in the ROI
+    MOTION_GATE = True
+    MOTION_ROI = None  # (x, y, w, h) as fractions of the frame; None = whole frame
+    MOTION_THRESHOLD = 0.01  # Fraction of ROI pixels that must change
+    MOTION_PIXEL_DELTA = 25  # Per-pixel grey-level change that counts as motion
+    MOTION_HOLD_SECONDS = 2.0  # Keep recognising this long after motion stops
+    MOTION_ACTIVE_SKIP = 1  # Process every Nth frame while motion is active
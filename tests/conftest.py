@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app, db  # noqa: E402
+from app.models import Student, Department  # noqa: E402
+from config import Config  # noqa: E402
+
+
+@pytest.fixture
+def config_class(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "test.db"}'
+        UPLOAD_FOLDER = str(tmp_path / 'photos')
+        THUMBNAIL_FOLDER = str(tmp_path / 'photos' / 'thumbs')
+        ENCODINGS_FOLDER = str(tmp_path / 'encodings')
+        ENCODING_CACHE_FOLDER = str(tmp_path / 'encoding_cache')
+        PROFILE_FOLDER = str(tmp_path / 'profiles')
+        CAMERA_WORKER = False
+        PROFILING_ENABLED = False
+
+    return TestConfig
+
+
+@pytest.fixture
+def app(config_class):
+    app = create_app(config_class)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_student(app):
+    def make(roll, name=None, department=None, **fields):
+        student = Student(student_id=roll, name=name or f'Student {roll}', department=department, **fields)
+        db.session.add(student)
+        db.session.commit()
+        return student
+    return make
+
+
+@pytest.fixture
+def make_department(app):
+    def make(code, name=None):
+        department = Department(code=code, name=name or f'Block {code}')
+        db.session.add(department)
+        db.session.commit()
+        return department
+    return make
+
+
+@pytest.fixture
+def add_attendance(app):
+    """Insert attendance rows: add_attendance(student, day, department=None, status='present', **fields)."""
+    from datetime import time
+    from app.models import Attendance
+
+    def add(student, day, department=None, status='present', **fields):
+        fields.setdefault('time_in', time(7, 30))
+        record = Attendance(student_id=student.id, department_id=department.id if department else None,
+                            date=day, status=status, **fields)
+        db.session.add(record)
+        db.session.commit()
+        return record
+    return add
@@ -0,0 +1,101 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.absences import student_summary, absent_days, working_days
+
+START = date(2024, 3, 4)  # a Monday
+END = START + timedelta(days=9)
+LONG_AGO = datetime(2000, 1, 1)
+
+
+def days(n, start=START):
+    return [start + timedelta(days=i) for i in range(n)]
+
+
+@pytest.fixture
+def blocks(make_department):
+    return make_department('A', 'Block A'), make_department('B', 'Block B')
+
+
+def by_roll(rows):
+    return {row['student_id']: row for row in rows}
+
+
+def test_rows_in_two_blocks_on_one_day_count_once(make_student, add_attendance, blocks):
+    a, b = blocks
+    alice = make_student('R1', 'Alice', department='Block A', created_at=LONG_AGO)
+    for day in days(10):
+        add_attendance(alice, day, a, 'present')
+        add_attendance(alice, day, b, 'late')
+
+    row = by_roll(student_summary(START, END))['R1']
+    assert (row['present'], row['late'], row['absent'], row['total']) == (10, 0, 0, 10)
+    assert row['attendance_pct'] == 100.0
+
+    only_b = by_roll(student_summary(START, END, department_id=b.id))['R1']
+    assert (only_b['present'], only_b['late'], only_b['total']) == (0, 10, 10)
+
+
+def test_unmarked_working_days_after_enrollment_are_absent(app, make_student, add_attendance, blocks):
+    app.config['WORKING_WEEKDAYS'] = (0, 1, 2, 3, 4)
+    app.config['ATTENDANCE_HOLIDAYS'] = ['2024-03-05']
+    a, _ = blocks
+    bob = make_student('R2', 'Bob', department='Block A', created_at=LONG_AGO)
+    late_joiner = make_student('R3', 'Cara', department='Block A', created_at=datetime(2024, 3, 11, 9, 0))
+    make_student('R4', 'Dan', department='Block A', created_at=LONG_AGO)
+    add_attendance(bob, START, a)
+    add_attendance(bob, date(2024, 3, 9), a)  # Saturday still counts when marked
+
+    assert working_days(START, END) == [date(2024, 3, d) for d in (4, 6, 7, 8, 11, 12, 13)]
+    rows = by_roll(student_summary(START, END))
+    assert (rows['R2']['present'], rows['R2']['absent'], rows['R2']['total']) == (2, 6, 8)
+    assert (rows['R3']['absent'], rows['R3']['total']) == (3, 3)
+    assert rows['R4']['attendance_pct'] == 0.0
+
+
+def test_absent_days_matches_roster_minus_marked_days(make_student, add_attendance, blocks):
+    a, b = blocks
+    alice = make_student('R1', 'Alice', department='Block A', created_at=LONG_AGO)
+    bob = make_student('R2', 'Bob', department='Block A', created_at=datetime(2024, 3, 8))
+    make_student('R3', 'Cara', department='Block B', created_at=LONG_AGO)
+    for day in days(10)[::2]:
+        add_attendance(alice, day, a)
+    add_attendance(alice, date(2024, 3, 5), b)  # marked elsewhere: not absent
+    add_attendance(bob, date(2024, 3, 12), a)
+
+    absent = absent_days(START, END, department_id=a.id)
+    got = sorted((r.student_id, r.date) for r in absent.itertuples())
+    expected = sorted(
+        [('R1', d) for d in days(10)[1::2] if d != date(2024, 3, 5)]
+        + [('R2', d) for d in days(10) if d >= date(2024, 3, 8) and d != date(2024, 3, 12)]
+    )
+    assert got == expected
+    assert set(absent['name']) == {'Alice', 'Bob'}
+    assert len(absent_days(START, END)) == len(expected) + 10  # Cara is absent every day
+
+
+def test_absent_days_and_summary_agree(make_student, add_attendance, blocks):
+    a, _ = blocks
+    for n in range(5):
+        student = make_student(f'R{n}', f'S{n}', department='Block A', created_at=LONG_AGO)
+        for day in days(10)[n:]:
+            add_attendance(student, day, a, 'late' if day.day % 3 else 'present')
+    implicit = absent_days(START, END).groupby('student_id').size()
+    for row in student_summary(START, END):
+        assert row['absent'] == implicit.get(row['student_id'], 0)
+
+
+def test_export_csv_includes_absent_rows(client, make_student, add_attendance, blocks):
+    a, _ = blocks
+    alice = make_student('R1', 'Alice', department='Block A', created_at=LONG_AGO)
+    add_attendance(alice, START, a)
+    csv = client.get('/reports/api/export_csv', query_string={'start': START, 'end': START + timedelta(days=2)})
+    lines = csv.data.decode().splitlines()
+    assert len(lines) == 4
+    assert lines[1] == 'R1,Alice,Block A,Block A,2024-03-04,07:30:00,present,,face_recognition'
+    assert lines[2:] == ['R1,Alice,Block A,,2024-03-05,,absent,,auto',
+                         'R1,Alice,Block A,,2024-03-06,,absent,,auto']
+    csv = client.get('/reports/api/export_csv', query_string={
+        'start': START, 'end': START + timedelta(days=2), 'include_absent': 0})
+    assert len(csv.data.decode().splitlines()) == 2
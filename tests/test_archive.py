@@ -0,0 +1,81 @@
+from datetime import date
+
+import pytest
+
+from app import db
+from app.archive import (archive_period, restore_period, archivable_periods, attendance_records,
+                         attendance_models, archive_boundary)
+from app.models import Attendance, AttendanceArchive, ArchivedPeriod
+
+
+@pytest.fixture
+def history(make_student, make_department, add_attendance):
+    student = make_student('R1')
+    block = make_department('A')
+    add_attendance(student, date(2024, 1, 10), block, confidence=0.9, marked_by='manual')
+    add_attendance(student, date(2024, 1, 11), block, status='late')
+    add_attendance(student, date(2024, 2, 5), block)
+    return student, block
+
+
+def test_archive_moves_one_month_and_restore_brings_it_back(history):
+    before = sorted((r.date, r.status, r.confidence, r.marked_by, r.time_in) for r in Attendance.query)
+    assert archive_period('2024-01') == 2
+    assert [r.date for r in Attendance.query] == [date(2024, 2, 5)]
+    assert AttendanceArchive.query.filter_by(period='2024-01').count() == 2
+    assert db.session.get(ArchivedPeriod, '2024-01').row_count == 2
+    assert archive_boundary() == date(2024, 1, 31)
+
+    assert restore_period('2024-01') == 2
+    after = sorted((r.date, r.status, r.confidence, r.marked_by, r.time_in) for r in Attendance.query)
+    assert after == before
+    assert AttendanceArchive.query.count() == 0 and archive_boundary() is None
+
+
+def test_reads_span_the_archive_only_when_needed(history):
+    archive_period('2024-01')
+    assert attendance_models(date(2024, 2, 1)) == [Attendance]
+    assert attendance_models(date(2024, 1, 31)) == [AttendanceArchive, Attendance]
+    records = attendance_records(date(2024, 1, 1), date(2024, 2, 28), order_by_date=True)
+    assert [r.date for r in records] == [date(2024, 1, 10), date(2024, 1, 11), date(2024, 2, 5)]
+    assert records[0].student.student_id == 'R1'
+
+
+def test_open_and_unknown_periods_are_rejected(history):
+    with pytest.raises(ValueError):
+        archive_period(date.today().strftime('%Y-%m'))
+    with pytest.raises(ValueError):
+        restore_period('2024-03')
+    with pytest.raises(ValueError):
+        archive_period('2024-13')
+
+
+def test_archivable_periods_keep_hot_days(history):
+    assert archivable_periods(60, today=date(2024, 4, 15)) == ['2024-01']
+    assert archivable_periods(0, today=date(2024, 3, 15)) == ['2024-01', '2024-02']
+
+
+def test_cli_archives_closed_months(app, history):
+    result = app.test_cli_runner().invoke(args=['archive-attendance', '--period', '2024-02'])
+    assert '2024-02: archived 1 rows' in result.output
+    result = app.test_cli_runner().invoke(args=['restore-attendance', '2024-02'])
+    assert 'restored 1 rows' in result.output
+    assert Attendance.query.filter(Attendance.date >= date(2024, 2, 1)).count() == 1
+
+
+def test_archived_idempotency_keys_still_dedupe_replays(history):
+    from app.marking import record_marks
+    student, block = history
+    mark = {'student_db_id': 'R1', 'timestamp': '2024-01-20T08:00:00', 'department_id': block.id,
+            'idempotency_key': 'k1'}
+    assert record_marks([mark])[0]['status'] == 'marked'
+    archive_period('2024-01')
+    assert AttendanceArchive.query.filter_by(idempotency_key='k1').count() == 1
+
+    replay = record_marks([mark])[0]
+    assert (replay['status'], replay['archived']) == ('duplicate', True)
+    assert AttendanceArchive.query.count() + Attendance.query.count() == 4
+
+    restore_period('2024-01')
+    assert Attendance.query.filter_by(idempotency_key='k1').count() == 1
+    assert record_marks([mark])[0]['status'] == 'duplicate'
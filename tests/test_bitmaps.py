@@ -0,0 +1,96 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import db
+from app.absences import student_summary
+from app.bitmaps import range_stats, rebuild_bitmaps
+from app.models import AttendanceBitmap
+
+START = date(2024, 3, 4)  # a Monday
+END = START + timedelta(days=9)
+LONG_AGO = datetime(2000, 1, 1)
+FIELDS = ('present', 'late', 'absent', 'total', 'attendance_pct')
+
+
+def days(n, start=START):
+    return [start + timedelta(days=i) for i in range(n)]
+
+
+def counts(rows):
+    return {row['student_id']: tuple(row[f] for f in FIELDS) for row in rows}
+
+
+def stored_bitmaps():
+    return {(b.student_id, b.department_id, b.status, b.year): b.bits for b in AttendanceBitmap.query}
+
+
+@pytest.fixture
+def blocks(make_department):
+    return make_department('A', 'Block A'), make_department('B', 'Block B')
+
+
+@pytest.fixture
+def mixed(make_student, add_attendance, blocks):
+    """Students with rows spread over two blocks, overlapping days and no rows at all."""
+    a, b = blocks
+    alice = make_student('R1', 'Alice', department='Block A', created_at=LONG_AGO)
+    for day in days(5):
+        add_attendance(alice, day, a, 'present')
+    for day in days(10):
+        add_attendance(alice, day, b, 'late')
+    bob = make_student('R2', 'Bob', department='Block A', created_at=datetime(2024, 3, 8))
+    add_attendance(bob, date(2024, 3, 8), a, 'absent')
+    add_attendance(bob, date(2024, 3, 9), b, 'present')
+    make_student('R3', 'Cara', department='Block B', created_at=LONG_AGO)
+    dan = make_student('R4', 'Dan', department='Block B', created_at=LONG_AGO, is_active=False)
+    add_attendance(dan, START, a, 'present')
+    add_attendance(dan, START + timedelta(days=1), None, 'present')
+    return blocks
+
+
+@pytest.mark.parametrize('block', [None, 'A', 'B'])
+def test_range_stats_matches_student_summary(app, mixed, block):
+    department_id = {'A': mixed[0].id, 'B': mixed[1].id}.get(block)
+    assert counts(range_stats(START, END, department_id)) == counts(student_summary(START, END, department_id))
+
+
+def test_department_filter_counts_only_that_blocks_rows(mixed):
+    a, _ = mixed
+    alice = counts(range_stats(START, END, a.id))['R1']
+    # Five present days in A; the late rows in B neither count nor make the other days absent
+    assert alice == (5, 0, 0, 5, 100.0)
+    assert counts(range_stats(START, END))['R1'] == (5, 5, 0, 10, 50.0)
+
+
+def test_bitmaps_follow_department_moves_and_deletes(app, make_student, add_attendance, blocks):
+    a, b = blocks
+    alice = make_student('R1', 'Alice', department='Block A', created_at=LONG_AGO)
+    records = [add_attendance(alice, day, a) for day in days(3)]
+
+    records[0].department_id = b.id
+    records[1].date = START + timedelta(days=5)
+    db.session.delete(records[2])
+    db.session.commit()
+
+    assert counts(range_stats(START, END, a.id))['R1'][0] == 1
+    assert counts(range_stats(START, END, b.id))['R1'][0] == 1
+    assert counts(range_stats(START, END, a.id)) == counts(student_summary(START, END, a.id))
+    incremental = stored_bitmaps()
+    rebuild_bitmaps()
+    assert stored_bitmaps() == incremental
+
+
+def test_rebuild_command_and_attendance_pct_route(app, client, mixed):
+    a, _ = mixed
+    expected = counts(range_stats(START, END, a.id))
+    AttendanceBitmap.query.delete()
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['rebuild-bitmaps'])
+    assert result.exit_code == 0 and 'Rebuilt' in result.output
+    response = client.get(f'/reports/api/attendance_pct?start={START}&end={END}&department_id={a.id}&below=100')
+    assert response.status_code == 200
+    rows = response.get_json()
+    assert {r['student_id'] for r in rows} == {'R2'}  # Alice is at 100% in block A
+    assert counts(rows)['R2'] == expected['R2']
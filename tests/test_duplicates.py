@@ -0,0 +1,41 @@
+import numpy as np
+
+from app.face_utils import find_duplicate_face, find_close_pairs, load_gallery, save_encoding
+
+
+def brute_force_pairs(matrix, tolerance):
+    pairs = []
+    for i in range(len(matrix)):
+        for j in range(i + 1, len(matrix)):
+            distance = float(np.linalg.norm(matrix[i] - matrix[j]))
+            if distance <= tolerance:
+                pairs.append((i, j))
+    return pairs
+
+
+def test_find_duplicate_face_returns_nearest_other_student():
+    keys = ['R1', 'R2', 'R3']
+    matrix = np.array([[0.0] * 128, [0.3] + [0.0] * 127, [1.0] * 128])
+    assert find_duplicate_face(matrix[0], keys, matrix, 0.5, exclude='R1') == ('R2', 0.3)
+    assert find_duplicate_face(matrix[2], keys, matrix, 0.5, exclude='R3') == (None, None)
+    assert find_duplicate_face(matrix[0], [], np.empty((0, 128)), 0.5) == (None, None)
+
+
+def test_blocked_audit_matches_brute_force():
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(0, 0.05, (50, 128))
+    matrix[10] = matrix[3] + 0.001
+    pairs = find_close_pairs(matrix, 0.55, block_size=7)
+    assert sorted((i, j) for i, j, _ in pairs) == brute_force_pairs(matrix, 0.55)
+    assert (3, 10) in [(i, j) for i, j, _ in pairs]
+    assert [p[2] for p in pairs] == sorted(p[2] for p in pairs)
+
+
+def test_gallery_is_reloaded_when_an_encoding_changes(tmp_path):
+    folder = str(tmp_path)
+    save_encoding(np.zeros(128), 'R1', folder)
+    keys, matrix = load_gallery(folder)
+    assert keys == ['R1'] and matrix.shape == (1, 128)
+    save_encoding(np.ones(128), 'R2', folder)
+    keys, matrix = load_gallery(folder)
+    assert sorted(keys) == ['R1', 'R2']
@@ -0,0 +1,62 @@
+import os
+import time
+
+from app import db
+from app.face_utils import EncodingCache, encode_face_from_image, encoding_cache
+
+
+def write_photo(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def test_key_depends_on_content_and_model(tmp_path):
+    a = write_photo(str(tmp_path / 'a.jpg'), b'same bytes')
+    b = write_photo(str(tmp_path / 'b.jpg'), b'same bytes')
+    cache = EncodingCache(str(tmp_path / 'cache'))
+    assert cache.key_for(a) == cache.key_for(b)
+    assert EncodingCache(str(tmp_path / 'cache'), model_version='v2').key_for(a) != cache.key_for(a)
+
+
+def test_hit_skips_encoding(tmp_path):
+    photo = write_photo(str(tmp_path / 'a.jpg'), b'photo')
+    cache = EncodingCache(str(tmp_path / 'cache'))
+    cache.put(cache.key_for(photo), ([0.5] * 128, None))
+    # face_recognition is never imported on a hit
+    assert encode_face_from_image(photo, cache) == ([0.5] * 128, None)
+
+
+def test_eviction_keeps_most_recent_and_lists_folder_rarely(tmp_path, monkeypatch):
+    cache = EncodingCache(str(tmp_path / 'cache'), max_entries=10)
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, '_entries', lambda: scans.append(1) or entries())
+    for n in range(30):
+        cache.put(f'k{n}', (None, None))
+        os.utime(cache._path(f'k{n}'), (time.time() - 100 + n, time.time() - 100 + n))
+    remaining = sorted(os.listdir(cache.folder))
+    assert len(remaining) <= cache.max_entries + cache.evict_slack
+    assert 'k29.pkl' in remaining and 'k0.pkl' not in remaining
+    assert len(scans) < 30 // cache.evict_slack + 2
+
+
+def test_encoding_cache_is_shared_per_process(app):
+    assert encoding_cache(app.config) is encoding_cache(app.config)
+
+
+def test_reencode_hashes_each_photo_once(app, make_student, monkeypatch, tmp_path):
+    app.static_folder = str(tmp_path / 'static')
+    photo = write_photo(os.path.join(app.static_folder, 'student_photos', 'r1.jpg'), b'photo')
+    student = make_student('R1', photo_path='student_photos/r1.jpg')
+    cache = encoding_cache(app.config)
+    cache.put(cache.key_for(photo), ([0.1] * 128, None))
+
+    hashed = []
+    key_for = type(cache).key_for
+    monkeypatch.setattr(type(cache), 'key_for', lambda self, path: hashed.append(path) or key_for(self, path))
+    result = app.test_cli_runner().invoke(args=['reencode-gallery'])
+    assert 'Encoded 0, reused 1 cached' in result.output
+    assert hashed == [photo]
+    assert db.session.get(type(student), student.id).encoding_path
@@ -0,0 +1,39 @@
+from app.events import EventBroadcaster, format_sse
+
+
+def test_publish_reaches_every_subscriber():
+    events = EventBroadcaster()
+    first, second = events.subscribe(), events.subscribe()
+    events.publish('mark', {'student_id': 'R1'})
+    expected = format_sse('mark', {'student_id': 'R1'})
+    assert first.get_nowait() == expected
+    assert second.get_nowait() == expected
+
+
+def test_full_queue_drops_oldest_message():
+    events = EventBroadcaster(max_queue=2)
+    q = events.subscribe()
+    for n in range(3):
+        events.publish('mark', {'n': n})
+    assert [q.get_nowait() for _ in range(2)] == [format_sse('mark', {'n': 1}), format_sse('mark', {'n': 2})]
+
+
+def test_stream_sends_initial_state_and_unsubscribes_on_close():
+    events = EventBroadcaster()
+    stream = events.stream(initial=[('session', {'running': False})])
+    assert next(stream).startswith('retry:')
+    assert next(stream) == format_sse('session', {'running': False})
+    assert events.subscriber_count == 1
+    events.publish('mark', {'n': 1})
+    assert next(stream) == format_sse('mark', {'n': 1})
+    stream.close()
+    assert events.subscriber_count == 0
+
+
+def test_camera_events_endpoint_starts_with_session_state(client):
+    response = client.get('/camera/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    next(chunks)
+    assert next(chunks).decode() == format_sse('session', {'running': False, 'marked_count': 0, 'messages': []})
+    response.close()
@@ -0,0 +1,24 @@
+import numpy as np
+
+from app.face_utils import assess_face_quality, quality_settings
+
+
+def test_small_face_is_rejected_before_anything_else():
+    frame = np.zeros((200, 200, 3), dtype=np.uint8)
+    assert assess_face_quality(frame, (10, 40, 40, 10), min_size=60) == 'too_small'
+
+
+def test_min_size_is_measured_in_original_frame_pixels():
+    frame = np.zeros((200, 200, 3), dtype=np.uint8)
+    # 40 px at half scale is an 80 px face in the camera frame, so it passes the size check
+    assert assess_face_quality(frame, (10, 50, 50, 10), min_size=60, scale=2) == 'blurry'
+
+
+def test_flat_crop_is_blurry():
+    frame = np.full((200, 200, 3), 128, dtype=np.uint8)
+    assert assess_face_quality(frame, (0, 150, 150, 0), min_size=60) == 'blurry'
+
+
+def test_quality_settings_follow_config():
+    assert quality_settings({'FACE_QUALITY_GATE': False}) is None
+    assert quality_settings({'FACE_MIN_SIZE': 80}) == {'min_size': 80, 'blur_threshold': 40.0, 'max_yaw': 0.35}
@@ -0,0 +1,118 @@
+import struct
+import threading
+import time
+import uuid
+
+import pytest
+
+from app.framebuffer import FrameRing, MAX_PROFILES, _AREA, _HEARTBEAT_AT, _FileLock
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing.create(f'test_ring_{uuid.uuid4().hex[:8]}', slots=4, slot_bytes=64, control_bytes=256)
+    yield ring
+    ring.close()
+
+
+@pytest.fixture
+def reader(ring):
+    reader = FrameRing.attach(ring.shm.name)
+    yield reader
+    reader.shm.close()
+
+
+def stop_heartbeat(ring):
+    struct.pack_into('<d', ring.shm.buf, _HEARTBEAT_AT, time.time() - 60)
+
+
+def test_frames_are_read_back_per_profile_across_wraps(ring, reader):
+    assert reader.latest_frame(0) == (0, b'')
+    for n in range(10):
+        ring.write_frame(b'low%d' % n, profile=1)
+    seq = ring.write_frame(b'high', profile=0)
+    assert reader.latest_frame(0) == (seq, b'high')
+    assert reader.latest_frame(1) == (seq - 1, b'low9')
+    assert reader.latest_frame(2) == (0, b'')
+    with pytest.raises(ValueError):
+        ring.write_frame(b'x' * 65)
+
+
+def test_watched_profiles_and_bounds(ring, reader):
+    reader.touch(3)
+    assert ring.watched_profiles() == [3]
+    for profile in (-1, MAX_PROFILES):
+        with pytest.raises(ValueError):
+            reader.touch(profile)
+    assert ring.control() == {'running': False}
+
+
+def test_control_requests_from_any_process(ring, reader):
+    reader.request(running=True, department_id=2)
+    assert ring.control() == {'running': True, 'department_id': 2}
+    ring.request(running=False)
+    assert reader.control() == {'running': False}
+
+
+def test_control_read_during_a_write_keeps_the_last_state(ring, reader):
+    reader.request(running=True)
+    assert reader.control() == {'running': True}
+    _AREA.pack_into(ring.shm.buf, ring._control_at, 0, 0)  # a writer died mid-write
+    assert reader.control(timeout=0.01) == {'running': True}
+    fresh = FrameRing.attach(ring.shm.name)
+    try:
+        with pytest.raises(TimeoutError):
+            fresh.control(timeout=0.01)
+    finally:
+        fresh.shm.close()
+
+
+def test_control_writers_wait_for_the_lock(ring, reader):
+    holder = _FileLock(reader._control_lock.path)
+    with holder:
+        writer = threading.Thread(target=reader.request, kwargs={'running': True})
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive() and ring.control() == {'running': False}
+    writer.join()
+    assert ring.control() == {'running': True}
+
+
+def test_heartbeat_marks_a_dead_worker(ring, reader):
+    assert reader.alive()
+    stop_heartbeat(ring)
+    assert not reader.alive()
+    ring.beat()
+    assert reader.alive(within=1)
+
+
+def test_routes_treat_a_silent_worker_as_stopped(app, client, ring):
+    from app.routes.camera import _ring_frames
+    app.config.update(CAMERA_WORKER=True, CAMERA_SHM_NAME=ring.shm.name)
+    ring.request(running=True)
+    ring.write_status({'running': True, 'marked_count': 3, 'messages': []})
+    assert client.get('/camera/status').get_json()['running'] is True
+
+    stop_heartbeat(ring)
+    assert client.get('/camera/status').get_json()['running'] is False
+    assert 'not running' in client.post('/camera/start', json={}).get_json()['error']
+
+    viewer = FrameRing.attach(ring.shm.name)
+    viewer.owner = False
+    assert list(_ring_frames(viewer, poll=0, timeout=5)) == []
+
+
+def test_event_stream_ends_when_the_worker_stops_so_browsers_reattach(app, client, ring):
+    from app.routes.camera import _ring_events
+    app.config.update(CAMERA_WORKER=True, CAMERA_SHM_NAME=f'{ring.shm.name}_missing')
+    body = client.get('/camera/events').get_data(as_text=True)
+    assert body.startswith('retry: 3000') and '"running": false' in body
+
+    ring.write_status({'running': True, 'marked_count': 0, 'messages': []})
+    viewer = FrameRing.attach(ring.shm.name)
+    events = _ring_events(viewer, poll=0, timeout=5)
+    assert next(events).startswith('retry')
+    assert '"running": true' in next(events)
+    stop_heartbeat(ring)
+    rest = list(events)
+    assert len(rest) == 1 and '"running": false' in rest[0]
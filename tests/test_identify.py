@@ -0,0 +1,66 @@
+import io
+
+import numpy as np
+
+from app.face_utils import parse_embeddings, match_encodings, save_encoding, EMBEDDING_BYTES
+from app.models import Attendance
+
+
+def embedding(value, first=None):
+    vector = np.full(128, value, dtype='<f4')
+    if first is not None:
+        vector[0] = first
+    return vector
+
+
+def test_parse_embeddings_reads_concatenated_float32():
+    data = embedding(0.25).tobytes() + embedding(-1.0, first=2.0).tobytes()
+    parsed = parse_embeddings(data)
+    assert parsed.shape == (2, 128) and parsed.dtype == np.float64
+    assert parsed[0][5] == 0.25 and parsed[1][0] == 2.0
+    assert parse_embeddings(data[:-1]) is None
+    assert parse_embeddings(b'') is None
+    assert parse_embeddings(embedding(0.0, first=np.nan).tobytes()) is None
+    assert parse_embeddings(embedding(np.inf).tobytes()) is None
+    assert len(data) == 2 * EMBEDDING_BYTES
+
+
+def test_match_encodings_takes_nearest_within_tolerance():
+    keys = ['R1', 'R2']
+    matrix = np.array([np.zeros(128), np.full(128, 0.1)])
+    matches = match_encodings([embedding(0.0, first=0.2), embedding(0.1), embedding(1.0)], keys, matrix, 0.5)
+    assert matches[0][0] == 'R1' and abs(matches[0][2] - 0.2) < 1e-6
+    assert matches[1][0] == 'R2' and abs(matches[1][1] - 1.0) < 1e-6
+    assert matches[2][0] is None and matches[2][1] == 0.0
+    assert match_encodings([embedding(0.0)], [], np.empty((0, 128)), 0.5) == [(None, 0.0, None)]
+
+
+def test_identify_matches_raw_embeddings_and_marks(app, client, make_student, make_department):
+    block = make_department('A', 'Block A')
+    make_student('R1', 'Alice', department='Block A')
+    save_encoding(np.zeros(128), 'R1', app.config['ENCODINGS_FOLDER'])
+    save_encoding(np.full(128, 0.5), 'R2', app.config['ENCODINGS_FOLDER'])
+    body = embedding(0.0, first=0.1).tobytes() + embedding(3.0).tobytes()
+
+    response = client.post('/camera/api/identify', data=body, content_type='application/octet-stream')
+    faces = response.get_json()['faces']
+    assert [(f['student_id'], f['name']) for f in faces] == [('R1', 'Alice'), (None, 'Unknown')]
+    assert Attendance.query.count() == 0
+
+    response = client.post(f'/camera/api/identify?mark=1&department_id={block.id}', data=body,
+                           content_type='application/octet-stream')
+    assert response.get_json()['faces'][0]['mark'] == 'marked'
+    assert Attendance.query.one().department_id == block.id
+
+    multipart = {'embeddings': (io.BytesIO(body[:EMBEDDING_BYTES]), 'faces.bin')}
+    response = client.post('/camera/api/identify?mark=1', data=multipart, content_type='multipart/form-data')
+    assert response.get_json()['faces'][0]['mark'] == 'already_marked'
+
+
+def test_identify_rejects_bad_bodies(client):
+    assert client.post('/camera/api/identify', data=b'\x00' * 100).status_code == 400
+    response = client.post('/camera/api/identify', data=embedding(np.nan).tobytes())
+    assert response.status_code == 400 and 'finite' in response.get_json()['error']
+    assert client.post('/camera/api/identify', data=b'').status_code == 400
+    too_many = embedding(0.0).tobytes() * 33
+    assert client.post('/camera/api/identify', data=too_many).status_code == 413
@@ -0,0 +1,44 @@
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from loadtest import Client  # noqa: E402
+
+
+def truncating_server():
+    """A server that promises 100 bytes and closes the connection after 5."""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                conn.recv(65536)
+                conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\nshort')
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.getsockname()[1]}'
+
+
+def test_truncated_responses_are_recorded_as_errors():
+    server, url = truncating_server()
+    phase = {'think_time': [0.0, 0.0], 'timeout': 2,
+             'requests': [{'name': 'status', 'path': '/camera/status'}]}
+    results = []
+    client = Client(url, phase, ['R00001'], 1, time.monotonic() + 0.3, results, seed=0)
+    try:
+        client.start()
+        client.join(5)
+    finally:
+        server.close()
+    assert not client.is_alive()
+    assert results and all(name == 'status' and not ok for name, _, ok in results)
@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.marking import marked_cache
+from app.models import Attendance
+
+
+@pytest.fixture
+def marked(make_student, make_department, add_attendance):
+    block = make_department('A', 'Block A')
+    student = make_student('R1', 'Alice', department='Block A')
+    record = add_attendance(student, date.today(), block)
+    marked_cache().warm()
+    return block, student, record
+
+
+def test_warm_loads_todays_marks_and_home_departments(marked):
+    block, _, _ = marked
+    cache = marked_cache()
+    assert cache.contains('R1', block.id)
+    assert not cache.contains('R1', None)
+    assert cache.home_department('R1') == (True, block.id)
+
+
+def test_repeat_hits_within_the_recheck_interval_issue_no_queries(marked):
+    block_id = marked[0].id
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        for _ in range(5):
+            assert marked_cache().contains('R1', block_id)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert statements == []
+
+
+def test_a_row_deleted_elsewhere_is_not_reported_as_marked_after_the_recheck(client, marked):
+    block, _, record = marked
+    cache = marked_cache()
+    # Deleted by another process: this cache is never told
+    db.session.execute(db.delete(Attendance).where(Attendance.id == record.id))
+    db.session.commit()
+
+    assert cache.contains('R1', block.id)  # trusted until the interval lapses
+    cache.recheck = 0
+    assert not cache.contains('R1', block.id)
+    response = client.post('/attendance/api/mark', json={'student_db_id': 'R1', 'department_id': block.id})
+    assert response.get_json()['success'] is True
+    assert client.post('/attendance/api/mark', json={'student_db_id': 'R1', 'department_id': block.id}) \
+        .get_json()['already_marked'] is True
+
+
+def test_marks_from_earlier_days_are_dropped_on_rollover(marked):
+    block, _, _ = marked
+    cache = marked_cache()
+    cache.day = date.today() - timedelta(days=1)
+    assert not cache.contains('R1', block.id)
+    cache.add('R1', block.id, day=date.today() - timedelta(days=1))
+    assert not cache.contains('R1', block.id)
+
+
+def test_deleting_or_moving_a_student_forgets_it(client, make_student, add_attendance, marked):
+    block, student, _ = marked
+    bob = make_student('R2', 'Bob', department='Block A')
+    add_attendance(bob, date.today(), block)
+    cache = marked_cache()
+    cache.warm()
+
+    client.post(f'/students/{bob.id}/edit', data={'name': 'Bob', 'department': 'Block B'})
+    assert cache.home_department('R2') == (False, None)
+
+    client.post(f'/students/{student.id}/delete')
+    assert cache.home_department('R1') == (False, None)
+    assert ('R1', block.id) not in cache._pairs
@@ -0,0 +1,68 @@
+from datetime import date
+
+import pytest
+
+from app.marking import record_marks, count_results
+from app.models import Attendance
+
+STAMP = '2024-03-04T08:15:00'
+
+
+@pytest.fixture
+def roster(make_student, make_department):
+    block = make_department('A', 'Block A')
+    return block, make_student('R1', department='Block A'), make_student('R2', department='Block A')
+
+
+def mark(roll, **fields):
+    return {'student_db_id': roll, 'timestamp': STAMP, **fields}
+
+
+def test_batch_marks_once_per_key_and_slot(roster):
+    block, _, _ = roster
+    results = record_marks([
+        mark('R1', idempotency_key='k1', confidence='0.93'),
+        mark('R1', idempotency_key='k1'),
+        mark('R2', department_id=str(block.id)),
+        mark('R2', department_id=block.id),
+        mark('R9'),
+    ], default_department=block.id)
+    assert [r['status'] for r in results] == ['marked', 'duplicate', 'marked', 'already_marked', 'error']
+    assert results[1]['record_id'] == results[0]['record_id']
+    record = Attendance.query.filter_by(idempotency_key='k1').one()
+    assert (record.confidence, record.department_id, record.date) == (0.93, block.id, date(2024, 3, 4))
+
+    replay = record_marks([mark('R1', idempotency_key='k1')], default_department=block.id)
+    assert replay[0] == {'index': 0, 'idempotency_key': 'k1', 'status': 'duplicate',
+                         'record_id': results[0]['record_id']}
+    assert Attendance.query.count() == 2
+
+
+def test_invalid_fields_are_per_mark_errors(roster):
+    block, _, _ = roster
+    results = record_marks([
+        mark('R1', confidence='x'),
+        mark('R1', department_id='abc'),
+        mark('R1', department_id=1.5),
+        mark('R1', department_id=999),
+        mark('R1', timestamp='yesterday'),
+        {'confidence': 0.9},
+        mark('R1', confidence=0.8, department_id=block.id),
+    ])
+    assert [r.get('error') for r in results] == [
+        'confidence must be a number', 'department_id must be an integer', 'department_id must be an integer',
+        'Department not found', 'Invalid timestamp', 'student_db_id required', None,
+    ]
+    assert count_results(results) == {'error': 6, 'marked': 1}
+
+
+def test_batch_endpoint_reports_bad_items_without_failing(client, roster):
+    block, _, _ = roster
+    response = client.post('/attendance/api/mark_batch', json={'department_id': block.id, 'marks': [
+        mark('R1', confidence='x'), mark('R2', department_id='abc'), mark('R2', idempotency_key='k2'),
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['counts'] == {'error': 2, 'marked': 1}
+
+    assert client.post('/attendance/api/mark_batch', json={'marks': []}).status_code == 400
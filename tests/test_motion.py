@@ -0,0 +1,39 @@
+import numpy as np
+
+from app.motion import MotionDetector, motion_settings
+
+
+def frames(value, count=1):
+    return [np.full((120, 160, 3), value, dtype=np.uint8) for _ in range(count)]
+
+
+def test_still_scene_is_idle_and_change_is_motion():
+    detector = MotionDetector(hold_seconds=0)
+    for frame in frames(50, 5):
+        detector.update(frame)
+    assert not detector.update(frames(50)[0])
+    assert detector.update(frames(200)[0])
+
+
+def test_motion_outside_roi_is_ignored():
+    detector = MotionDetector(roi=(0, 0, 0.5, 1.0), hold_seconds=0)
+    still = frames(50)[0]
+    for _ in range(5):
+        detector.update(still)
+    moved = still.copy()
+    moved[:, 100:] = 250  # right half only
+    assert not detector.update(moved)
+
+
+def test_motion_is_held_after_it_stops():
+    detector = MotionDetector(hold_seconds=60)
+    for frame in frames(50, 3):
+        detector.update(frame)
+    assert detector.update(frames(200)[0])
+    for frame in frames(200, 20):
+        assert detector.update(frame)
+
+
+def test_motion_settings_follow_config():
+    assert motion_settings({'MOTION_GATE': False}) is None
+    assert motion_settings({'MOTION_ROI': (0, 0, 1, 1)})['roi'] == (0, 0, 1, 1)
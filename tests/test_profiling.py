@@ -0,0 +1,63 @@
+import logging
+
+import pytest
+
+from app import create_app, db
+from app import profiling
+from app.profiling import _short_params
+
+
+@pytest.fixture
+def profiled(config_class):
+    class ProfiledConfig(config_class):
+        PROFILING_ENABLED = True
+
+    profiling._endpoint_stats.clear()
+    app = create_app(ProfiledConfig)
+    with app.app_context():
+        yield app.test_client()
+        db.session.remove()
+    profiling._endpoint_stats.clear()
+
+
+def test_nothing_is_collected_when_profiling_is_off(client):
+    profiling._endpoint_stats.clear()
+    response = client.get('/students/')
+    assert 'X-Query-Count' not in response.headers
+    assert client.get('/no/such/page').status_code == 404
+    assert profiling._endpoint_stats == {}
+    assert client.get('/_debug/query-stats').status_code == 404
+
+
+def test_stats_are_keyed_by_route_and_unmatched_urls_share_one_entry(profiled):
+    response = profiled.get('/students/')
+    assert int(response.headers['X-Query-Count']) >= 1
+    for n in range(20):
+        profiled.get(f'/probe-{n}.php')
+
+    rows = {row['endpoint']: row for row in profiled.get('/_debug/query-stats').get_json()}
+    assert rows['<unmatched>']['requests'] == 20
+    assert rows['students.list_students']['requests'] == 1
+    assert not any(endpoint.startswith('/') for endpoint in rows)
+
+
+def test_profile_files_are_written_on_request(profiled, tmp_path):
+    response = profiled.get('/students/?_profile=1')
+    assert (tmp_path / 'profiles' / response.headers['X-Profile-File']).exists()
+
+
+def test_slow_query_log_shortens_bulk_parameters(config_class, caplog):
+    rows = [{'id': n, 'name': 'x' * 50} for n in range(1000)]
+    text = _short_params(rows, executemany=True)
+    assert text.startswith('1000 rows, first ') and len(text) < 600
+    assert _short_params(('a', 1), executemany=False) == "('a', 1)"
+
+    class LogEverything(config_class):
+        SLOW_QUERY_MS = 0
+
+    app = create_app(LogEverything)
+    with app.app_context(), caplog.at_level(logging.WARNING):
+        db.session.execute(db.text('SELECT :n'), {'n': 'y' * 2000})
+        db.session.remove()
+    logged = [r.getMessage() for r in caplog.records if 'Slow query' in r.getMessage()]
+    assert logged and all(len(message) < 1000 for message in logged)
@@ -0,0 +1,38 @@
+import pytest
+import sqlalchemy as sa
+
+import app as app_module
+from app import create_app, SCHEMA_VERSION
+
+
+def stored_version(config_class):
+    engine = sa.create_engine(config_class.SQLALCHEMY_DATABASE_URI)
+    try:
+        with engine.connect() as conn:
+            return conn.execute(sa.text('SELECT version FROM schema_version')).scalar()
+    except sa.exc.OperationalError:
+        return None
+    finally:
+        engine.dispose()
+
+
+def test_failed_migration_is_not_stamped_and_retried(config_class, monkeypatch):
+    def broken(db):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(app_module, '_run_migrations', broken)
+    with pytest.raises(RuntimeError):
+        create_app(config_class)
+    assert stored_version(config_class) is None
+    monkeypatch.undo()
+
+    create_app(config_class)
+    assert stored_version(config_class) == SCHEMA_VERSION
+
+
+def test_warm_boot_skips_migrations(config_class, monkeypatch):
+    create_app(config_class)
+    calls = []
+    monkeypatch.setattr(app_module, '_run_migrations', calls.append)
+    create_app(config_class)
+    assert calls == []
@@ -0,0 +1,86 @@
+import warnings
+
+import cv2
+import numpy as np
+import pytest
+
+from app import streaming
+from app.streaming import JpegEncoder, encode_frame, jpeg_encoder, profile_name, stream_profiles
+
+
+def frame(width=640, height=480):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+
+def decoded_width(jpeg):
+    return cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).shape[1]
+
+
+def test_profile_names_fall_back_to_the_default():
+    config = {'STREAM_PROFILES': {'big': (640, 80), 'small': (160, 40)}, 'STREAM_DEFAULT_PROFILE': 'small'}
+    assert stream_profiles(config) == {'big': (640, 80), 'small': (160, 40)}
+    assert profile_name(config, 'big') == 'big'
+    assert profile_name(config, 'huge') == 'small'
+    assert profile_name({**config, 'STREAM_DEFAULT_PROFILE': 'gone'}) == 'big'
+    assert profile_name({}) == 'high'
+
+
+def test_encoders_produce_jpeg_and_are_shared_per_backend():
+    encoder = JpegEncoder('opencv')
+    assert encoder.backend == 'opencv'
+    assert encoder.encode(frame()[:, ::-1]).startswith(b'\xff\xd8')  # non-contiguous input is fine
+    assert jpeg_encoder({'JPEG_ENCODER': 'opencv'}) is jpeg_encoder({'JPEG_ENCODER': 'opencv'})
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        turbo = JpegEncoder('turbo')
+    assert (turbo.backend == 'opencv') == bool(caught)
+
+
+def test_encode_frame_downscales_but_never_upscales():
+    encoder = JpegEncoder('opencv')
+    assert decoded_width(encode_frame(frame(), (320, 50), encoder)) == 320
+    assert decoded_width(encode_frame(frame(), (500, 50), encoder)) == 500
+    assert decoded_width(encode_frame(frame(200, 150), (320, 50), encoder)) == 200
+    low = encode_frame(frame(), (640, 30), encoder)
+    high = encode_frame(frame(), (640, 95), encoder)
+    assert len(low) < len(high)
+
+
+def test_viewers_share_one_encode_per_frame_and_profile(app, monkeypatch):
+    from app.routes.camera import CameraSession
+    calls = []
+    real = streaming.encode_frame
+
+    def counting(frame, profile, encoder):
+        calls.append(profile)
+        return real(frame, profile, encoder)
+    monkeypatch.setattr(streaming, 'encode_frame', counting)
+
+    session = CameraSession(app=app)
+    session.running = True
+
+    def publish():
+        with session._frame_ready:
+            session._frame = frame()
+            session._frame_seq += 1
+
+    high_a, high_b, low = session.stream('high'), session.stream('high'), session.stream('low')
+    publish()
+    chunks = [next(high_a), next(high_b), next(low)]
+    assert all(chunk.startswith(b'--frame\r\n') for chunk in chunks)
+    assert chunks[0] == chunks[1]
+    publish()
+    next(high_a), next(high_b)
+    high, small = app.config['STREAM_PROFILES']['high'], app.config['STREAM_PROFILES']['low']
+    assert sorted(calls) == sorted([high, high, small])
+    session.running = False
+
+
+@pytest.mark.parametrize('profile', ['high', 'low'])
+def test_feed_without_a_session_serves_the_placeholder(client, profile):
+    response = client.get(f'/camera/feed?profile={profile}')
+    assert response.status_code == 200
+    assert response.mimetype == 'multipart/x-mixed-replace'
+    assert b'\xff\xd8' in next(response.response)
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from app import db
+
+
+def search(client, **params):
+    return client.get('/students/api/search', query_string=params).get_json()
+
+
+def test_prefix_search_on_name_or_roll(client, make_student):
+    make_student('R100', 'Alice')
+    make_student('R200', 'Bob')
+    make_student('X100', 'Ralph')
+    assert [s['student_id'] for s in search(client, q='R1')['students']] == ['R100']
+    assert sorted(s['name'] for s in search(client, q='r')['students']) == ['Alice', 'Bob', 'Ralph']
+    assert search(client, q='lic')['total'] == 0  # prefix only
+
+
+def test_like_wildcards_are_literal(client, make_student):
+    make_student('R_1', 'Under')
+    make_student('RX1', 'Other')
+    assert [s['student_id'] for s in search(client, q='R_')['students']] == ['R_1']
+
+
+def test_filters_and_pagination(client, make_student):
+    for n in range(30):
+        make_student(f'R{n:03d}', f'Student {n:03d}', department='Block A' if n % 2 else 'Block B', year=n % 4 + 1)
+    page = search(client, department='Block A', per_page=10, page=2)
+    assert page['total'] == 15 and page['pages'] == 2
+    assert len(page['students']) == 5
+    assert all(s['department'] == 'Block A' for s in page['students'])
+    assert search(client, department='Block A', year=2)['total'] == len(
+        [n for n in range(30) if n % 2 and n % 4 + 1 == 2])
+
+
+def test_recent_sort_uses_created_at_index(client, make_student):
+    make_student('R1', 'Old', created_at=datetime(2024, 1, 1))
+    make_student('R2', 'New', created_at=datetime(2025, 1, 1))
+    assert [s['name'] for s in search(client, sort='recent')['students']] == ['New', 'Old']
+    plan = db.session.execute(sa.text(
+        'EXPLAIN QUERY PLAN SELECT * FROM students ORDER BY created_at DESC LIMIT 24')).all()
+    details = ' '.join(row[-1] for row in plan)
+    assert 'ix_students_created_at' in details and 'TEMP B-TREE' not in details
@@ -0,0 +1,88 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.routes import students as students_routes
+from app.thumbnails import thumbnail_path
+
+
+def jpeg_bytes(color=(200, 100, 50), size=(640, 480)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def uploads(app):
+    return sorted(f for f in os.listdir(app.config['UPLOAD_FOLDER']) if f != 'thumbs')
+
+
+def thumbnails(app):
+    folder = app.config['THUMBNAIL_FOLDER']
+    return sorted(os.listdir(folder)) if os.path.exists(folder) else []
+
+
+@pytest.fixture
+def photo(app, make_student):
+    """A student whose photo was uploaded before thumbnails existed."""
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], 'R1_abcd1234.jpg'), 'wb') as f:
+        f.write(jpeg_bytes())
+    make_student('R1', photo_path='student_photos/R1_abcd1234.jpg')
+    return 'R1_abcd1234'
+
+
+@pytest.mark.parametrize('accept, mimetype', [
+    ('image/webp,*/*', 'image/webp'),
+    ('*/*', 'image/jpeg'),
+    ('image/*', 'image/jpeg'),
+    ('image/png,image/jpeg;q=0.9', 'image/jpeg'),
+    ('image/webp;q=0', 'image/jpeg'),
+])
+def test_webp_only_when_named_explicitly(client, photo, accept, mimetype):
+    response = client.get(f'/students/thumbs/{photo}', headers={'Accept': accept})
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    assert 'Accept' in response.headers['Vary']
+
+
+def test_missing_thumbnail_is_generated_from_the_students_photo(app, client, photo):
+    assert client.get(f'/students/thumbs/{photo}').status_code == 200
+    assert os.path.exists(thumbnail_path(photo, app.config['THUMBNAIL_FOLDER'], 'jpg'))
+
+
+def test_unknown_name_is_404_without_listing_uploads(client, photo, monkeypatch):
+    def no_listing(path):
+        raise AssertionError('upload folder listed')
+
+    monkeypatch.setattr(os, 'listdir', no_listing)
+    assert client.get('/students/thumbs/R1_other').status_code == 404
+    assert client.get('/students/thumbs/nobody_abcd1234').status_code == 404
+
+
+def test_rejected_upload_leaves_no_files(app, client, monkeypatch):
+    monkeypatch.setattr(students_routes, 'encode_face_from_image', lambda path, cache: (None, 'No face'))
+    response = client.post('/students/add', data={
+        'student_id': 'R2', 'name': 'Bob', 'photo': (io.BytesIO(jpeg_bytes()), 'bob.jpg'),
+    })
+    assert response.status_code == 400
+    assert uploads(app) == []
+    assert thumbnails(app) == []
+
+
+def test_replacing_a_photo_removes_the_old_one(app, client, photo, monkeypatch):
+    from app.models import Student
+    monkeypatch.setattr(students_routes, 'encode_face_from_image', lambda path, cache: (np.zeros(128), None))
+    client.get(f'/students/thumbs/{photo}')  # old thumbnails exist
+    student = Student.query.filter_by(student_id='R1').first()
+
+    response = client.post(f'/students/{student.id}/edit', data={
+        'name': 'Alice', 'photo': (io.BytesIO(jpeg_bytes((0, 0, 255))), 'new.jpg'),
+    })
+    assert response.get_json()['success']
+    new_name = response.get_json()['student']['thumbnail_name']
+    assert new_name != photo
+    assert thumbnails(app) == [f'{new_name}.jpg', f'{new_name}.webp']
+    assert uploads(app) == [f'{new_name}.jpg']